@@ -1,13 +1,14 @@
 import os
-import shutil
-import time
 import threading
 from pathlib import Path
 from tkinter import *
 from tkinter import filedialog, ttk, messagebox
 import tkinter.font as tkFont
 from PIL import Image, ImageTk
-import json
+
+from file_organizer_engine import (CONFIG_FILE, DEFAULT_MAPPINGS, DEFAULT_WORKERS, JOURNAL_FILE, FolderWatcher,
+                                   MoveJournal, NameIndex, load_mappings, save_mappings, plan_moves, deduplicate,
+                                   execute_moves, undo_run)
 
 class FileOrganizer:
     def __init__(self, root):
@@ -18,44 +19,35 @@ class FileOrganizer:
         self.root.configure(bg="#f5f5f7")
         
         # Default file mappings
-        self.default_mappings = {
-            "Images": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"],
-            "Documents": [".doc", ".docx", ".txt", ".pdf", ".xlsx", ".pptx", ".csv", ".rtf"],
-            "Videos": [".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv"],
-            "Audio": [".mp3", ".wav", ".flac", ".aac", ".ogg", ".m4a"],
-            "Archives": [".zip", ".rar", ".7z", ".tar", ".gz"],
-            "Code": [".py", ".js", ".html", ".css", ".java", ".cpp", ".c", ".php", ".json"]
-        }
+        self.default_mappings = DEFAULT_MAPPINGS
         
         # Load custom mappings if exists
-        self.config_file = os.path.join(os.path.expanduser("~"), "file_organizer_config.json")
+        self.config_file = CONFIG_FILE
         self.load_config()
         
         # Variables
         self.source_dir = StringVar(value=os.path.expanduser("~"))
         self.status_text = StringVar(value="Ready to organize files")
+        self.quarantine_duplicates = BooleanVar(value=False)
         self.is_organizing = False
         self.organized_count = 0
         self.total_files = 0
         self.animation_speed = 10
+        self.move_workers = DEFAULT_WORKERS
+        self.watch_stop = None
         
         self.create_ui()
     
     def load_config(self):
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    self.file_mappings = json.load(f)
-            else:
-                self.file_mappings = self.default_mappings.copy()
+            self.file_mappings = load_mappings(self.config_file)
         except Exception as e:
             print(f"Error loading config: {e}")
             self.file_mappings = self.default_mappings.copy()
     
     def save_config(self):
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.file_mappings, f, indent=2)
+            save_mappings(self.file_mappings, self.config_file)
         except Exception as e:
             print(f"Error saving config: {e}")
     
@@ -125,6 +117,18 @@ class FileOrganizer:
                            command=self.reset_mappings, activebackground="#e68600", activeforeground="white", cursor="hand2")
         reset_button.pack(side=LEFT, padx=(10, 0))
         
+        duplicates_check = Checkbutton(action_frame, text="Quarantine duplicates", variable=self.quarantine_duplicates,
+                                       font=("Helvetica", 10), bg="#f5f5f7", fg="#1e1e1e", activebackground="#f5f5f7", cursor="hand2")
+        duplicates_check.pack(side=LEFT, padx=(10, 0))
+        
+        undo_button = Button(action_frame, text="Undo Last Run", font=("Helvetica", 10), bg="#8e8e93", fg="white", bd=0, padx=15, pady=8,
+                          command=self.start_undo, activebackground="#7a7a7f", activeforeground="white", cursor="hand2")
+        undo_button.pack(side=RIGHT, padx=(0, 10))
+        
+        self.watch_button = Button(action_frame, text="Watch Folder", font=("Helvetica", 10), bg="#5856d6", fg="white", bd=0, padx=15, pady=8,
+                                command=self.toggle_watch, activebackground="#4a49b8", activeforeground="white", cursor="hand2")
+        self.watch_button.pack(side=RIGHT, padx=(0, 10))
+        
         organize_button = Button(action_frame, text="Organize Files", font=("Helvetica", 12, "bold"), bg="#007aff", fg="white", bd=0, padx=20, pady=10,
                                command=self.start_organizing, activebackground="#0069d9", activeforeground="white", cursor="hand2")
         organize_button.pack(side=RIGHT)
@@ -316,12 +320,6 @@ class FileOrganizer:
             self.save_config()
             self.show_mappings()
     
-    def count_files(self, directory):
-        file_count = 0
-        for _, _, files in os.walk(directory):
-            file_count += len(files)
-        return file_count
-    
     def start_organizing(self):
         if self.is_organizing:
             messagebox.showinfo("Info", "File organization is already in progress")
@@ -332,79 +330,140 @@ class FileOrganizer:
             messagebox.showerror("Error", "Invalid source directory")
             return
         
+        # Offer to finish an interrupted run of this folder instead of rescanning
+        journal = self.load_journal()
+        if journal is not None and journal.pending and journal.is_within(source_dir):
+            if messagebox.askyesno("Resume", f"The last run of {source_dir} was interrupted. "
+                                             "Resume it instead of starting over?"):
+                self.begin_run("Resuming previous run...", self.resume_files, journal)
+                return
+        
+        self.skip_duplicates = self.quarantine_duplicates.get()
+        self.begin_run("Scanning files...", self.organize_files)
+    
+    def toggle_watch(self):
+        if self.watch_stop is not None:
+            self.watch_stop.set()
+            self.watch_stop = None
+            self.watch_button.configure(text="Watch Folder")
+            self.status_text.set("Stopped watching")
+            return
+        
+        source_dir = self.source_dir.get()
+        if not os.path.isdir(source_dir):
+            messagebox.showerror("Error", "Invalid source directory")
+            return
+        
+        # Only files that arrive from now on are organized
+        self.watch_stop = threading.Event()
+        watcher = FolderWatcher(source_dir, self.file_mappings, on_move=self.on_watched_move)
+        threading.Thread(target=watcher.run, args=(self.watch_stop,), daemon=True).start()
+        
+        self.watch_button.configure(text="Stop Watching")
+        self.status_text.set(f"Watching {source_dir} for new files...")
+    
+    def on_watched_move(self, move):
+        folder = os.path.basename(os.path.dirname(move.target))
+        self.root.after(0, self.status_text.set, f"Moved {os.path.basename(move.source)} to {folder}")
+    
+    def begin_run(self, status, target, *args):
         # Start organizing in a separate thread
         self.is_organizing = True
         self.organized_count = 0
-        self.total_files = self.count_files(source_dir)
-        
-        if self.total_files == 0:
-            messagebox.showinfo("Info", "No files found in the selected directory")
-            self.is_organizing = False
-            return
+        self.total_files = 0
         
         self.progress_bar["value"] = 0
-        self.status_text.set("Starting to organize files...")
+        self.status_text.set(status)
         
-        threading.Thread(target=self.organize_files, daemon=True).start()
+        threading.Thread(target=target, args=args, daemon=True).start()
+    
+    def load_journal(self):
+        if not os.path.exists(JOURNAL_FILE):
+            return None
+        try:
+            return MoveJournal.load(JOURNAL_FILE)
+        except Exception as e:
+            print(f"Error reading journal: {e}")
+            return None
     
     def organize_files(self):
         source_dir = self.source_dir.get()
         
         try:
-            for root, _, files in os.walk(source_dir):
-                for file in files:
-                    if not self.is_organizing:  # Check if cancelled
-                        break
-                    
-                    file_path = os.path.join(root, file)
-                    
-                    # Skip files that are not in the root directory
-                    if os.path.dirname(file_path) != source_dir:
-                        continue
-                    
-                    file_ext = os.path.splitext(file)[1].lower()
-                    
-                    # Find which folder this file belongs to
-                    target_folder = None
-                    for folder, extensions in self.file_mappings.items():
-                        if file_ext in extensions:
-                            target_folder = folder
-                            break
-                    
-                    if target_folder:
-                        # Create target folder if it doesn't exist
-                        target_dir = os.path.join(source_dir, target_folder)
-                        os.makedirs(target_dir, exist_ok=True)
-                        
-                        # Move file
-                        target_path = os.path.join(target_dir, file)
-                        
-                        # Handle filename conflicts
-                        if os.path.exists(target_path):
-                            base_name, ext = os.path.splitext(file)
-                            counter = 1
-                            while os.path.exists(target_path):
-                                new_name = f"{base_name}_{counter}{ext}"
-                                target_path = os.path.join(target_dir, new_name)
-                                counter += 1
-                        
-                        shutil.move(file_path, target_path)
-                        self.organized_count += 1
-                        
-                        # Update UI
-                        self.update_progress()
-                        time.sleep(0.05)  # Small delay for animation
+            name_index = NameIndex()
+            planned = plan_moves(source_dir, self.file_mappings, name_index)
+            if self.skip_duplicates:
+                self.root.after(0, self.status_text.set, "Checking for duplicates...")
+                planned = deduplicate(planned, "quarantine", name_index, self.move_workers)
+            self.total_files = len(planned)
+            
+            if self.total_files == 0:
+                self.root.after(0, self.no_files_found)
+                return
+            
+            journal = MoveJournal.create(JOURNAL_FILE, planned)
+            self.resume_files(journal)
+            
+        except Exception as e:
+            self.root.after(0, self.complete_organization, False, str(e))
+    
+    def resume_files(self, journal):
+        try:
+            self.total_files = len(journal.planned)
+            execute_moves(journal.planned, workers=self.move_workers, progress=self.update_progress,
+                          is_cancelled=lambda: not self.is_organizing, journal=journal)
             
             # Final update
             self.root.after(0, self.complete_organization, True)
             
         except Exception as e:
             self.root.after(0, self.complete_organization, False, str(e))
+        finally:
+            journal.close()
     
-    def update_progress(self):
-        progress = (self.organized_count / self.total_files) * 100 if self.total_files > 0 else 0
-        self.root.after(0, lambda: self.progress_bar.configure(value=progress))
-        self.root.after(0, lambda: self.status_text.set(f"Organizing files... ({self.organized_count}/{self.total_files})"))
+    def start_undo(self):
+        if self.is_organizing:
+            messagebox.showinfo("Info", "File organization is already in progress")
+            return
+        
+        journal = self.load_journal()
+        if journal is None or journal.undone or not journal.planned:
+            messagebox.showinfo("Info", "There is no run to undo")
+            return
+        
+        if messagebox.askyesno("Confirm Undo", "Move the files from the last run back where they came from?"):
+            self.begin_run("Undoing last run...", self.undo_files, journal)
+    
+    def undo_files(self, journal):
+        try:
+            restored = undo_run(journal, workers=self.move_workers, progress=self.update_progress)
+            self.root.after(0, self.complete_undo, restored)
+        except Exception as e:
+            self.root.after(0, self.complete_organization, False, str(e))
+        finally:
+            journal.close()
+    
+    def update_progress(self, organized_count, total_files):
+        self.organized_count = organized_count
+        progress = (organized_count / total_files) * 100 if total_files > 0 else 0
+        status = f"Organizing files... ({organized_count}/{total_files})"
+        
+        def apply():
+            self.progress_bar.configure(value=progress)
+            self.status_text.set(status)
+        
+        self.root.after(0, apply)
+    
+    def no_files_found(self):
+        self.is_organizing = False
+        self.status_text.set("Ready to organize files")
+        messagebox.showinfo("Info", "No files found in the selected directory")
+    
+    def complete_undo(self, restored):
+        self.is_organizing = False
+        self.status_text.set(f"Undo complete! {restored} files restored.")
+        messagebox.showinfo("Complete", f"Restored {restored} files to their original location.")
+        self.animate_progress_reset()
     
     def complete_organization(self, success, error_msg=None):
         self.is_organizing = False
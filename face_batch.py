@@ -0,0 +1,240 @@
+"""
+Batch recognition for the Face Recognition System.
+
+Tags every image under a folder tree without the GUI:
+
+    python face_batch.py photos/ -o results.jsonl
+    python face_batch.py photos/ -o results.csv --top-k 3
+
+Images are streamed from the tree to a pool of worker processes that detect
+and encode faces, and only a few images per worker are in flight at a time,
+so memory stays flat however large the archive is. Faces are matched against
+the gallery in face_store/ in this process, and every image's result is
+written to the output as soon as it is ready. Running the same command again
+resumes: images already in the output are skipped.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from face_dataset import IMAGE_EXTENSIONS
+from face_gallery import INDEX_TYPES, GalleryMatcher
+from face_store import EncodingStore
+from face_workers import completed_in_window, spawn_pool
+
+CSV_FIELDS = ["file", "top", "right", "bottom", "left", "name", "distance", "error"]
+
+
+def iter_images(root):
+    """Yield the path of every image under root, depth first, without listing it all up front."""
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                        yield entry.path
+        except OSError as e:
+            print(f"Skipping {folder}: {e}", file=sys.stderr)
+
+
+def detect_file(path, model="hog", max_side=None):
+    """
+    Find and encode the faces in one image. Runs in a worker process.
+
+    Images larger than max_side are decoded at reduced size (JPEG draft mode)
+    and shrunk before detection; boxes are scaled back to the original size.
+    Returns (boxes, encodings).
+    """
+    import face_recognition
+
+    with Image.open(path) as img:
+        width = img.size[0]
+        if max_side and max(img.size) > max_side:
+            img.draft("RGB", (max_side, max_side))
+            img.thumbnail((max_side, max_side))
+        scale = width / img.size[0]
+        image = np.asarray(img.convert("RGB"))
+
+    locations = face_recognition.face_locations(image, model=model)
+    encodings = face_recognition.face_encodings(image, locations)
+    boxes = [[int(round(v * scale)) for v in location] for location in locations]
+    return boxes, [np.asarray(encoding, dtype=np.float32) for encoding in encodings]
+
+
+class ResultWriter:
+    """
+    Appends one record per image to a JSONL or CSV file.
+
+    Opening an existing file reads back which images it already covers; a
+    last line cut short by an interrupted run is dropped first.
+    """
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.done = set()
+        if os.path.exists(path):
+            self._truncate_partial_line()
+            self._read_done()
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="" if fmt == "csv" else None, encoding="utf-8")
+        if fmt == "csv":
+            self.writer = csv.writer(self.file)
+            if is_new:
+                self.writer.writerow(CSV_FIELDS)
+
+    def _truncate_partial_line(self):
+        # Scan back from the end in blocks rather than reading the whole file
+        with open(self.path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                block = min(65536, position)
+                f.seek(position - block)
+                newline = f.read(block).rfind(b"\n")
+                if newline >= 0:
+                    position = position - block + newline + 1
+                    break
+                position -= block
+            if position != end:
+                f.truncate(position)
+
+    def _read_done(self):
+        with open(self.path, "r", newline="" if self.fmt == "csv" else None, encoding="utf-8") as f:
+            if self.fmt == "csv":
+                self.done.update(row["file"] for row in csv.DictReader(f))
+            else:
+                self.done.update(json.loads(line)["file"] for line in f if line.strip())
+
+    def write(self, file, faces, error=None):
+        if self.fmt == "csv":
+            if error or not faces:
+                self.writer.writerow([file, "", "", "", "", "", "", error or ""])
+            for face in faces:
+                best = face["matches"][0] if face["matches"] else {"name": "Unknown", "distance": ""}
+                self.writer.writerow([file, *face["box"], best["name"], best["distance"], ""])
+        else:
+            record = {"file": file, "faces": faces}
+            if error:
+                record["error"] = error
+            self.file.write(json.dumps(record) + "\n")
+        # One flush per image, so an interrupted run loses at most the images in flight
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run_batch(root, writer, matcher, workers=None, tolerance=0.6, top_k=1, model="hog",
+              max_side=None, progress=None):
+    """
+    Recognize every image under root that the writer does not have yet.
+
+    progress(processed, faces) is called as images finish. Returns
+    (processed, faces).
+    """
+    workers = workers or os.cpu_count() or 1
+    processed = 0
+    face_count = 0
+
+    with spawn_pool(workers) as executor:
+        paths = (path for path in iter_images(root)
+                 if os.path.relpath(path, root) not in writer.done)
+        for path, future in completed_in_window(executor, detect_file, paths, workers * 2,
+                                                model, max_side):
+            relative = os.path.relpath(path, root)
+            try:
+                boxes, encodings = future.result()
+            except Exception as e:
+                writer.write(relative, [], f"{type(e).__name__}: {e}")
+            else:
+                matches = matcher.match(encodings, tolerance=tolerance, top_k=top_k) if boxes else []
+                faces = [{"box": box,
+                          "matches": [{"name": name, "distance": round(distance, 4)}
+                                      for name, distance in face_matches]}
+                         for box, face_matches in zip(boxes, matches)]
+                writer.write(relative, faces)
+                face_count += len(faces)
+            processed += 1
+            if progress:
+                progress(processed, face_count)
+    return processed, face_count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recognize faces in every image under a folder.")
+    parser.add_argument("folder", help="folder tree of images to tag")
+    parser.add_argument("-o", "--output", required=True,
+                        help="results file; run again with the same file to resume")
+    parser.add_argument("--format", choices=["jsonl", "csv"],
+                        help="results format (default: from the --output extension, else jsonl)")
+    parser.add_argument("--store", default="face_store",
+                        help="encodings store to match against (default: %(default)s)")
+    parser.add_argument("--index", choices=list(INDEX_TYPES), default="brute",
+                        help="gallery index (default: %(default)s)")
+    parser.add_argument("--tolerance", type=float, default=0.6,
+                        help="largest distance that still counts as a match (default: %(default)s)")
+    parser.add_argument("--top-k", type=int, default=1,
+                        help="matches kept per face; CSV only has the best (default: %(default)s)")
+    parser.add_argument("--model", choices=["hog", "cnn"], default="hog",
+                        help="face detector (default: %(default)s)")
+    parser.add_argument("--max-side", type=int,
+                        help="shrink images larger than this many pixels before detection")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.folder):
+        parser.error(f"{args.folder} is not a directory")
+    if args.format is None:
+        args.format = "csv" if args.output.lower().endswith(".csv") else "jsonl"
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    matcher = GalleryMatcher(index=args.index)
+    store = EncodingStore(args.store)
+    if store.exists():
+        store.load()
+        matcher.set_gallery(store.main_encodings, store.names, fingerprint=store.fingerprint,
+                            appended=store.appended_encodings)
+    else:
+        print(f"No encodings store at {args.store}; every face will be Unknown", file=sys.stderr)
+
+    writer = ResultWriter(args.output, args.format)
+    if writer.done:
+        print(f"Resuming: {len(writer.done)} images already in {args.output}", file=sys.stderr)
+
+    started = time.monotonic()
+    last_report = [started]
+
+    def report(processed, faces):
+        now = time.monotonic()
+        if now - last_report[0] >= 2:
+            last_report[0] = now
+            rate = processed / (now - started)
+            print(f"{processed} images, {faces} faces ({rate:.1f} images/s)", file=sys.stderr)
+
+    try:
+        processed, faces = run_batch(args.folder, writer, matcher, workers=args.workers,
+                                     tolerance=args.tolerance, top_k=args.top_k, model=args.model,
+                                     max_side=args.max_side, progress=report)
+    finally:
+        writer.close()
+    print(f"Done: {processed} images, {faces} faces", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Dataset handling for the Face Recognition System.
+
+Training is incremental: a manifest records the size, mtime and content hash
+of every image in face_dataset/, so only new or changed images are encoded
+and images that were deleted are dropped. Encoding runs on a process pool.
+
+A catalog keeps the number of images per person, so the dataset views and
+statistics do not list the whole tree on every refresh.
+"""
+
+import hashlib
+import io
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import as_completed
+
+from face_workers import spawn_pool
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# What a worker reports for one image. encoding is None if no face was found;
+# unchanged is True if the content hash matched and nothing was decoded.
+EncodedImage = namedtuple("EncodedImage", ["path", "size", "mtime_ns", "hash", "encoding", "unchanged"])
+
+
+def list_dataset_images(dataset_folder):
+    """Return {relative path: (person, os.stat_result)} for every image in the dataset."""
+    images = {}
+    with os.scandir(dataset_folder) as people:
+        for person in people:
+            if not person.is_dir():
+                continue
+            with os.scandir(person.path) as files:
+                for entry in files:
+                    if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                        images[os.path.join(person.name, entry.name)] = (person.name, entry.stat())
+    return images
+
+
+def encode_image(path, known_hash=None):
+    """Encode the first face in an image. Runs in a worker process."""
+    import face_recognition
+
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        data = f.read()
+    digest = hashlib.blake2b(data).hexdigest()
+    if digest == known_hash:
+        return EncodedImage(path, st.st_size, st.st_mtime_ns, digest, None, True)
+
+    image = face_recognition.load_image_file(io.BytesIO(data))
+    encodings = face_recognition.face_encodings(image)
+    encoding = encodings[0] if encodings else None
+    return EncodedImage(path, st.st_size, st.st_mtime_ns, digest, encoding, False)
+
+
+class DatasetCatalog:
+    """
+    Image count per person, updated as the app adds and removes images.
+
+    The folder is only listed again when the catalog is missing or unreadable,
+    or when rescan() is called, e.g. after images were changed outside the app.
+    """
+
+    def __init__(self, dataset_folder, path):
+        self.dataset_folder = dataset_folder
+        self.path = path
+        self.people = {}
+        self.image_count = 0
+        try:
+            with open(path, "r") as f:
+                self.people = json.load(f)["people"]
+            self.image_count = sum(self.people.values())
+        except (OSError, ValueError, KeyError):
+            self.rescan()
+
+    @property
+    def people_count(self):
+        return len(self.people)
+
+    def rescan(self):
+        self.people = {}
+        for person, _ in list_dataset_images(self.dataset_folder).values():
+            self.people[person] = self.people.get(person, 0) + 1
+        # People with no images yet still have a folder
+        with os.scandir(self.dataset_folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    self.people.setdefault(entry.name, 0)
+        self.image_count = sum(self.people.values())
+        self.save()
+
+    def add_images(self, person, count):
+        self.people[person] = self.people.get(person, 0) + count
+        self.image_count += count
+        self.save()
+
+    def remove_person(self, person):
+        self.image_count -= self.people.pop(person, 0)
+        self.save()
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"people": self.people}, f)
+        os.replace(temp_path, self.path)
+
+
+class TrainingManifest:
+    """Per-image record of what the current encodings were built from."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.path)
+
+
+def incremental_train(dataset_folder, encodings, names, sources, manifest,
+                      workers=None, progress=None):
+    """
+    Bring a gallery up to date with the dataset folder.
+
+    encodings, names and sources are parallel lists; sources holds the dataset
+    relative path each encoding came from. Images whose size and mtime match
+    the manifest are kept as they are. Images with a new mtime but the same
+    size are hashed, and only re-encoded if their content changed. Images no
+    longer on disk are dropped. progress(done, total) is called as images are
+    encoded.
+
+    Returns (encodings, names, sources, encoded_count).
+    """
+    images = list_dataset_images(dataset_folder)
+
+    gallery = {source: (encoding, name) for encoding, name, source in zip(encodings, names, sources)}
+    for source in list(gallery):
+        if source not in images or source not in manifest.entries:
+            del gallery[source]
+    for source in list(manifest.entries):
+        if source not in images:
+            del manifest.entries[source]
+
+    to_encode = {}
+    for source, (person, st) in images.items():
+        entry = manifest.entries.get(source)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            continue
+        known_hash = entry["hash"] if entry and entry["size"] == st.st_size else None
+        to_encode[source] = known_hash
+
+    done = 0
+    if to_encode:
+        with spawn_pool(workers) as executor:
+            futures = {executor.submit(encode_image, os.path.join(dataset_folder, source), known_hash): source
+                       for source, known_hash in to_encode.items()}
+            for future in as_completed(futures):
+                source = futures[future]
+                done += 1
+                if progress:
+                    progress(done, len(to_encode))
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Left out of the manifest, so it is retried next time
+                    print(f"Error processing {source}: {str(e)}")
+                    continue
+                manifest.entries[source] = {"size": result.size, "mtime_ns": result.mtime_ns,
+                                            "hash": result.hash}
+                if not result.unchanged:
+                    # Changed images move to the end
+                    gallery.pop(source, None)
+                    if result.encoding is not None:
+                        gallery[source] = (result.encoding, images[source][0])
+
+    # Kept rows stay in their old order with new ones after them, so a gallery
+    # that only grew can be appended to rather than rewritten
+    ordered = list(gallery)
+    return ([gallery[source][0] for source in ordered],
+            [gallery[source][1] for source in ordered],
+            ordered,
+            done)
@@ -0,0 +1,73 @@
+"""
+Frame display for the Face Recognition System.
+
+Showing a frame used to build a new PIL image, a new PhotoImage and a new
+canvas item every time, and the old items were never deleted. DisplaySurface
+keeps one of each and only rebuilds them when the frame or canvas size
+changes.
+"""
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class DisplaySurface:
+    """
+    Shows RGB frames on a Tk canvas through a single canvas item.
+
+    The scaled size is worked out once per frame size and canvas size. Frames
+    are resized straight into a preallocated RGBA buffer that a PIL image
+    shares memory with, and the PhotoImage is updated in place with paste().
+    """
+
+    def __init__(self, canvas, default_size=(640, 480)):
+        self.canvas = canvas
+        self.default_size = default_size
+        self._item = None
+        self._photo = None
+        self._key = None
+        self._size = None
+        self._rgb = None
+        self._rgba = None
+        self._pil_image = None
+
+    def show(self, image):
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        if canvas_width <= 1:  # Not initialized yet
+            canvas_width, canvas_height = self.default_size
+
+        key = (image.shape[:2], canvas_width, canvas_height)
+        if key != self._key:
+            self._resize_surface(image.shape[:2], canvas_width, canvas_height)
+            self._key = key
+
+        width, height = self._size
+        if image.shape[:2] == (height, width):
+            cv2.cvtColor(image, cv2.COLOR_RGB2RGBA, dst=self._rgba)
+        else:
+            cv2.resize(image, (width, height), dst=self._rgb)
+            cv2.cvtColor(self._rgb, cv2.COLOR_RGB2RGBA, dst=self._rgba)
+        self._photo.paste(self._pil_image)
+
+    def _resize_surface(self, image_size, canvas_width, canvas_height):
+        # Resize image to fit canvas while preserving aspect ratio
+        height, width = image_size
+        scale = min(canvas_width / width, canvas_height / height)
+        new_width = max(1, int(width * scale))
+        new_height = max(1, int(height * scale))
+        self._size = (new_width, new_height)
+
+        self._rgb = np.empty((new_height, new_width, 3), dtype=np.uint8)
+        self._rgba = np.empty((new_height, new_width, 4), dtype=np.uint8)
+        # Shares memory with the buffer, so it always shows the latest pixels
+        self._pil_image = Image.frombuffer("RGBA", self._size, self._rgba, "raw", "RGBA", 0, 1)
+        self._photo = ImageTk.PhotoImage("RGBA", self._size)
+
+        self.canvas.config(width=new_width, height=new_height)
+        if self._item is None:
+            self._item = self.canvas.create_image(new_width // 2, new_height // 2, image=self._photo)
+        else:
+            self.canvas.itemconfig(self._item, image=self._photo)
+            self.canvas.coords(self._item, new_width // 2, new_height // 2)
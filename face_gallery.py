@@ -0,0 +1,423 @@
+"""
+Gallery matching for the Face Recognition System.
+
+Holds the known face encodings as one contiguous float32 matrix and searches
+it through a pluggable index:
+
+    brute     exact search, one batched distance pass over the whole gallery
+    ivf       inverted file: k-means cells, only the nearest cells are searched
+    centroid  per-person centroids pick the candidate people, then exact search
+
+Indexes can be saved next to the encodings store so large galleries do not
+rebuild them at every start. Run this file to compare recall and latency:
+
+    python face_gallery.py --size 100000 --people 20000
+"""
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+ENCODING_SIZE = 128
+
+# Everything match() reads, replaced as a whole so a search never mixes an
+# old index with new names. labels is the integer person id per encoding,
+# used by the per-person index. Rows of appended follow those of matrix and
+# are searched exhaustively by appended_index.
+Gallery = namedtuple("Gallery", ["names", "matrix", "people", "labels", "fingerprint", "index",
+                                 "appended", "appended_index"])
+
+
+def _as_matrix(vectors):
+    return np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(-1, ENCODING_SIZE))
+
+
+def pairwise_distances(queries, matrix, matrix_sq_norms=None):
+    """Euclidean distances as a (queries, matrix) array, with one matrix product."""
+    if matrix_sq_norms is None:
+        matrix_sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+    # |a - b|^2 = |a|^2 + |b|^2 - 2ab
+    sq = np.einsum("ij,ij->i", queries, queries)[:, None] + matrix_sq_norms[None, :]
+    sq -= 2.0 * (queries @ matrix.T)
+    np.maximum(sq, 0.0, out=sq)
+    return np.sqrt(sq, out=sq)
+
+
+def _top_k(distances, k):
+    """Indices and distances of the k smallest entries of each row, best first."""
+    k = min(k, distances.shape[1])
+    if k < distances.shape[1]:
+        indices = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(k), (distances.shape[0], k))
+    picked = np.take_along_axis(distances, indices, axis=1)
+    order = np.argsort(picked, axis=1)
+    return np.take_along_axis(picked, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+def _merge_top_k(first, second, offset, k):
+    """Merge two (distances, indices) results, shifting the second's indices by offset."""
+    distances = np.concatenate([first[0], second[0]], axis=1)
+    indices = np.concatenate([first[1], np.where(second[1] >= 0, second[1] + offset, -1)], axis=1)
+    order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+class BruteForceIndex:
+    """Exact search over every encoding."""
+
+    kind = "brute"
+
+    def build(self, matrix, labels):
+        self.matrix = matrix
+        self.sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        return self
+
+    def search(self, queries, k):
+        """Return (distances, indices), each (queries, k), padded with inf and -1."""
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(queries) and len(self.matrix):
+            found_d, found_i = _top_k(pairwise_distances(queries, self.matrix, self.sq_norms), k)
+            distances[:, :found_d.shape[1]] = found_d
+            indices[:, :found_i.shape[1]] = found_i
+        return distances, indices
+
+    def state(self):
+        return {}
+
+    def load_state(self, state, matrix, labels):
+        return self.build(matrix, labels)
+
+
+class IVFIndex(BruteForceIndex):
+    """
+    Inverted file index.
+
+    The gallery is split into cells around k-means centroids. A query is
+    compared with the centroids, then exactly against the members of its
+    nprobe nearest cells only.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, nlist=None, nprobe=8, iterations=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+
+    def _train_centroids(self, matrix):
+        rng = np.random.default_rng(self.seed)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(len(matrix))))
+        nlist = min(nlist, len(matrix))
+
+        # Train on a sample; a few dozen points per cell is plenty
+        sample = matrix
+        if len(matrix) > nlist * 64:
+            sample = matrix[rng.choice(len(matrix), nlist * 64, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids
+
+    @staticmethod
+    def _assign(matrix, centroids, chunk=8192):
+        assignment = np.empty(len(matrix), dtype=np.int64)
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        for start in range(0, len(matrix), chunk):
+            block = matrix[start:start + chunk]
+            assignment[start:start + chunk] = np.argmin(
+                pairwise_distances(block, centroids, centroid_norms), axis=1)
+        return assignment
+
+    def _group(self, assignment):
+        # Members of each cell are stored contiguously: order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=len(self.centroids))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def build(self, matrix, labels):
+        super().build(matrix, labels)
+        if len(matrix) == 0:
+            self.centroids = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+            self.order = np.empty(0, dtype=np.int64)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            return self
+        self.centroids = self._train_centroids(matrix)
+        self._group(self._assign(matrix, self.centroids))
+        return self
+
+    def search(self, queries, k):
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(queries) == 0 or len(self.centroids) == 0:
+            return distances, indices
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        _, cells = _top_k(pairwise_distances(queries, self.centroids), nprobe)
+        for row, (query, probe) in enumerate(zip(queries, cells)):
+            candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+            if len(candidates) == 0:
+                continue
+            found_d, found_i = _top_k(
+                pairwise_distances(query[None, :], self.matrix[candidates], self.sq_norms[candidates]), k)
+            distances[row, :found_d.shape[1]] = found_d[0]
+            indices[row, :found_i.shape[1]] = candidates[found_i[0]]
+        return distances, indices
+
+    def state(self):
+        return {"centroids": self.centroids, "order": self.order, "offsets": self.offsets}
+
+    def load_state(self, state, matrix, labels):
+        BruteForceIndex.build(self, matrix, labels)
+        self.centroids = state["centroids"]
+        self.order = state["order"]
+        self.offsets = state["offsets"]
+        return self
+
+
+class CentroidIndex(IVFIndex):
+    """
+    Per-person pre-filter.
+
+    Each person's encodings are averaged into one centroid. A query is matched
+    against the centroids first, and only the encodings of the nprobe closest
+    people are searched exactly.
+    """
+
+    kind = "centroid"
+
+    def __init__(self, nprobe=8):
+        super().__init__(nprobe=nprobe)
+
+    def build(self, matrix, labels):
+        BruteForceIndex.build(self, matrix, labels)
+        people = int(labels.max()) + 1 if len(labels) else 0
+        sums = np.zeros((people, ENCODING_SIZE), dtype=np.float32)
+        np.add.at(sums, labels, matrix)
+        counts = np.bincount(labels, minlength=people)
+        self.centroids = sums / np.maximum(counts, 1)[:, None]
+        self._group(labels)
+        return self
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (BruteForceIndex, IVFIndex, CentroidIndex)}
+
+
+def gallery_fingerprint(matrix, names):
+    """Identifies a gallery, so a saved index is only reused for the same data."""
+    digest = hashlib.blake2b(matrix.tobytes(), digest_size=16)
+    digest.update("\0".join(names).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def save_index(index, path, fingerprint):
+    np.savez(path, kind=index.kind, fingerprint=fingerprint, **index.state())
+
+
+def load_index(path, kind, fingerprint, matrix, labels):
+    """Load a saved index of the given kind, or return None if it is missing or stale."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if str(data["kind"]) != kind or str(data["fingerprint"]) != fingerprint:
+                return None
+            state = {key: data[key] for key in data.files if key not in ("kind", "fingerprint")}
+    except (OSError, ValueError, KeyError):
+        return None
+    return INDEX_TYPES[kind]().load_state(state, matrix, labels)
+
+
+class GalleryMatcher:
+    """Known faces as an (n, 128) float32 matrix plus a parallel list of names."""
+
+    def __init__(self, encodings=(), names=(), index="brute", index_file=None):
+        self.index_kind = index
+        self.index_file = index_file
+        self._gallery = None
+        # Serializes rebuilds; match() only reads self._gallery and never waits
+        self._build_lock = threading.Lock()
+        self.set_gallery(encodings, names)
+
+    @property
+    def names(self):
+        return self._gallery.names
+
+    @property
+    def matrix(self):
+        return self._gallery.matrix
+
+    @property
+    def people(self):
+        return self._gallery.people
+
+    @property
+    def labels(self):
+        return self._gallery.labels
+
+    @property
+    def index(self):
+        return self._gallery.index
+
+    def set_gallery(self, encodings, names, fingerprint=None, appended=()):
+        """
+        Replace the gallery. fingerprint identifies encodings for the saved
+        index; if not given it is computed from the data when an index needs it.
+
+        encodings is used as is when it already is a float32 matrix, so a
+        memory-mapped store stays mapped. appended holds a few more rows, such
+        as a store's recent enrollments; they are searched exhaustively next
+        to the index instead of being copied into one matrix with encodings.
+        names covers encodings followed by appended.
+
+        Safe to call while other threads match: they keep using the old
+        gallery until the new one, index included, is ready.
+        """
+        names = list(names)
+        matrix = _as_matrix(encodings)
+        appended = _as_matrix(appended)
+        if names:
+            people, labels = np.unique(np.asarray(names), return_inverse=True)
+            labels = labels.reshape(-1)
+        else:
+            people, labels = np.empty(0, dtype=str), np.empty(0, dtype=np.int64)
+        appended_index = BruteForceIndex().build(appended, labels[len(matrix):])
+        gallery = Gallery(names, matrix, people, labels, fingerprint, None, appended, appended_index)
+        with self._build_lock:
+            self._gallery = self._with_index(gallery, self.index_kind)
+
+    def set_index(self, kind):
+        with self._build_lock:
+            if kind != self.index_kind:
+                self._gallery = self._with_index(self._gallery, kind)
+                self.index_kind = kind
+
+    def _with_index(self, gallery, kind):
+        """gallery with an index of the given kind over its matrix, loaded from index_file or built."""
+        labels = gallery.labels[:len(gallery.matrix)]
+        if kind == BruteForceIndex.kind:
+            return gallery._replace(index=BruteForceIndex().build(gallery.matrix, labels))
+
+        if gallery.fingerprint is None:
+            fingerprint = gallery_fingerprint(gallery.matrix, gallery.names[:len(gallery.matrix)])
+            gallery = gallery._replace(fingerprint=fingerprint)
+        index = None
+        if self.index_file:
+            index = load_index(self.index_file, kind, gallery.fingerprint, gallery.matrix, labels)
+        if index is None:
+            index = INDEX_TYPES[kind]().build(gallery.matrix, labels)
+            if self.index_file:
+                save_index(index, self.index_file, gallery.fingerprint)
+        return gallery._replace(index=index)
+
+    def __len__(self):
+        return len(self._gallery.names)
+
+    def distances(self, face_encodings):
+        """Exact distances as a (faces, gallery) matrix, in one pass."""
+        gallery = self._gallery
+        faces = _as_matrix(face_encodings)
+        if len(faces) == 0 or len(gallery.names) == 0:
+            return np.empty((len(faces), len(gallery.names)), dtype=np.float32)
+        return np.concatenate([pairwise_distances(faces, gallery.matrix),
+                               pairwise_distances(faces, gallery.appended)], axis=1)
+
+    def match(self, face_encodings, tolerance=0.6, top_k=1):
+        """
+        Return, for each face, up to top_k (name, distance) pairs within tolerance.
+
+        Pairs are sorted by distance, best first. A face with no gallery entry
+        within tolerance gets an empty list.
+        """
+        # One snapshot, so the names always belong to the index searched
+        gallery = self._gallery
+        faces = _as_matrix(face_encodings)
+        distances, indices = gallery.index.search(faces, top_k)
+        if len(gallery.appended):
+            distances, indices = _merge_top_k((distances, indices),
+                                              gallery.appended_index.search(faces, top_k),
+                                              len(gallery.matrix), top_k)
+
+        results = []
+        for row_d, row_i in zip(distances, indices):
+            results.append([(gallery.names[i], float(d)) for d, i in zip(row_d, row_i)
+                            if i >= 0 and d <= tolerance])
+        return results
+
+
+def synthetic_gallery(size, people, seed=0):
+    """Clustered random encodings that loosely resemble real face encodings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(scale=0.1, size=(people, ENCODING_SIZE)).astype(np.float32)
+    labels = rng.integers(0, people, size)
+    matrix = centers[labels] + rng.normal(scale=0.03, size=(size, ENCODING_SIZE)).astype(np.float32)
+    return matrix, [f"person_{label}" for label in labels], centers
+
+
+def benchmark(matrix, names, queries, k=1, kinds=("brute", "ivf", "centroid")):
+    """
+    Compare index kinds on one gallery.
+
+    Returns rows of (kind, build seconds, milliseconds per query, recall@k),
+    with recall measured against exact brute-force results.
+    """
+    exact = GalleryMatcher(matrix, names).index.search(queries, k)[1]
+    rows = []
+    for kind in kinds:
+        matcher = GalleryMatcher(index="brute")
+        matcher.set_gallery(matrix, names)
+        start = time.perf_counter()
+        matcher.set_index(kind)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = np.concatenate([matcher.index.search(queries[i:i + 1], k)[1]
+                                for i in range(len(queries))])
+        query_ms = (time.perf_counter() - start) * 1000 / max(1, len(queries))
+
+        hits = sum(len(set(e) & set(f)) for e, f in zip(exact, found))
+        rows.append((kind, build_time, query_ms, hits / max(1, exact.size)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark face gallery indexes.")
+    parser.add_argument("--store", help="use the gallery from this encodings store folder")
+    parser.add_argument("--size", type=int, default=100000, help="synthetic gallery size")
+    parser.add_argument("--people", type=int, default=20000, help="synthetic number of people")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(1)
+    if args.store:
+        from face_store import EncodingStore
+        store = EncodingStore(args.store)
+        store.load()
+        matrix, names = _as_matrix(store.encodings), store.names
+    else:
+        matrix, names, _ = synthetic_gallery(args.size, args.people)
+    picks = rng.integers(0, len(matrix), args.queries)
+    queries = matrix[picks] + rng.normal(scale=0.02, size=(args.queries, ENCODING_SIZE)).astype(np.float32)
+
+    print(f"Gallery: {len(matrix)} encodings, {len(set(names))} people, {args.queries} queries")
+    print(f"{'index':<10}{'build s':>10}{'ms/query':>10}{'recall@' + str(args.k):>10}")
+    for kind, build_time, query_ms, recall in benchmark(matrix, names, queries, args.k):
+        print(f"{kind:<10}{build_time:>10.2f}{query_ms:>10.3f}{recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
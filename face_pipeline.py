@@ -0,0 +1,351 @@
+"""
+Threaded video pipeline for the Face Recognition System.
+
+    capture thread per source -> shared detection pool -> render (Tk main thread)
+
+Each source (webcam index, stream URL or video file) is read by its own
+capture thread. One dispatcher takes the newest frame of every source; frames
+that arrive while it is busy replace the one waiting rather than queueing
+behind it, so slow detection lowers the detection rate instead of adding lag.
+Faces are followed by each source's FaceTracker where possible, and the frames
+that need full detection are sent together to one pool of detection
+processes. The render stage runs on the UI thread, draws the latest
+detections on the newest frame and shows it. Every queue between stages holds
+at most one item.
+
+Run this file to measure throughput without the GUI:
+
+    python face_pipeline.py 0 1 rtsp://localhost:8554/cam video.mp4
+"""
+
+import argparse
+import math
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from face_tracking import FaceTracker
+from face_workers import spawn_pool
+
+# A captured frame, numbered in capture order, with its time.monotonic() stamp
+Frame = namedtuple("Frame", ["number", "captured", "image"])
+
+# Faces found in a frame, in full frame coordinates
+Detections = namedtuple("Detections", ["frame_number", "captured", "locations", "names"])
+
+
+class LatestQueue:
+    """A queue of one item. Putting replaces an item that has not been taken yet."""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=1)
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Raises queue.Empty if nothing arrives within timeout."""
+        return self._queue.get(timeout=timeout)
+
+    def get_nowait(self):
+        return self._queue.get_nowait()
+
+
+class StageStats:
+    """Smoothed rate and latency of one pipeline stage."""
+
+    def __init__(self, smoothing=0.9):
+        self.smoothing = smoothing
+        self.interval = 0.0
+        self.latency = 0.0
+        self._last = None
+
+    def tick(self, latency=0.0):
+        now = time.monotonic()
+        if self._last is not None:
+            self.interval = self.smoothing * self.interval + (1 - self.smoothing) * (now - self._last)
+        self._last = now
+        self.latency = self.smoothing * self.latency + (1 - self.smoothing) * latency
+
+    @property
+    def fps(self):
+        return 1.0 / self.interval if self.interval > 0 else 0.0
+
+
+def draw_labels(image, locations, names):
+    """Draw a box and a name label for every face, in place."""
+    for (top, right, bottom, left), name in zip(locations, names):
+        cv2.rectangle(image, (left, top), (right, bottom), (0, 255, 0), 2)
+        cv2.rectangle(image, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
+        font = cv2.FONT_HERSHEY_DUPLEX
+        cv2.putText(image, name, (left + 6, bottom - 6), font, 0.8, (255, 255, 255), 1)
+
+
+def detect_and_encode(rgb_image):
+    """Find and encode the faces in one scaled-down frame. Runs in a worker process."""
+    import face_recognition
+
+    locations = face_recognition.face_locations(rgb_image)
+    return locations, face_recognition.face_encodings(rgb_image, locations)
+
+
+def tile_frames(images):
+    """Lay equally sized tiles out in a near-square grid, sized after the first image."""
+    if len(images) == 1:
+        return images[0]
+    height, width = images[0].shape[:2]
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    grid = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+    for i, image in enumerate(images):
+        if image.shape[:2] != (height, width):
+            image = cv2.resize(image, (width, height))
+        row, column = divmod(i, columns)
+        grid[row * height:(row + 1) * height, column * width:(column + 1) * width] = image
+    return grid
+
+
+class VideoSource:
+    """
+    One camera, stream or video file, read by its own capture thread.
+
+    Files are played back at playback_fps; live sources are read as fast as
+    they deliver frames.
+    """
+
+    def __init__(self, name, capture, playback_fps=0):
+        self.name = name
+        self.capture = capture
+        self.playback_fps = playback_fps
+        self.frames_for_detection = LatestQueue()
+        self.frames_for_display = LatestQueue()
+        self.detections = LatestQueue()
+        self.latest = Detections(-1, 0.0, [], [])
+        self.stats = {"capture": StageStats(), "detect": StageStats(), "render": StageStats()}
+        self.tracker = None
+        self.ended = False
+        self._thread = None
+
+    def start(self, stop_event):
+        self._thread = threading.Thread(target=self._capture_loop, args=(stop_event,), daemon=True)
+        self._thread.start()
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _capture_loop(self, stop_event):
+        interval = 1.0 / self.playback_fps if self.playback_fps else 0.0
+        due = time.monotonic()
+        number = 0
+        while not stop_event.is_set():
+            ret, image = self.capture.read()
+            if not ret:
+                self.ended = True
+                return
+            frame = Frame(number, time.monotonic(), image)
+            number += 1
+            self.stats["capture"].tick()
+            self.frames_for_detection.put(frame)
+            self.frames_for_display.put(frame)
+
+            if interval:
+                due = max(due + interval, time.monotonic() - interval)
+                stop_event.wait(max(0.0, due - time.monotonic()))
+
+    def next_frame(self):
+        """
+        Return the newest frame as RGB with the latest detections drawn on it,
+        or None if no new frame has been captured since the last call.
+        """
+        try:
+            self.latest = self.detections.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            frame = self.frames_for_display.get_nowait()
+        except queue.Empty:
+            return None
+
+        # The dispatcher may still be reading this frame, so draw on a copy
+        image = cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB)
+        draw_labels(image, self.latest.locations, self.latest.names)
+        self.stats["render"].tick(time.monotonic() - frame.captured)
+        return image
+
+    def status(self):
+        capture, detect, render = self.stats["capture"], self.stats["detect"], self.stats["render"]
+        status = (f"{self.name}: capture {capture.fps:.0f} fps | "
+                  f"detect {detect.fps:.1f} fps, {detect.latency * 1000:.0f} ms | "
+                  f"display {render.fps:.0f} fps, {render.latency * 1000:.0f} ms behind | "
+                  f"detection skipped {self.frames_for_detection.dropped} frames")
+        if self.tracker is not None:
+            status += f" | full detection on {self.tracker.detection_share:.0%} of frames"
+        return status
+
+
+def open_source(spec):
+    """Open a device index ("0"), a stream URL or a video file as a VideoSource."""
+    capture = cv2.VideoCapture(int(spec) if spec.isdigit() else spec)
+    if not capture.isOpened():
+        capture.release()
+        raise OSError(f"Could not open video source {spec}")
+    playback_fps = capture.get(cv2.CAP_PROP_FPS) if os.path.isfile(spec) else 0
+    return VideoSource(spec, capture, playback_fps or 0)
+
+
+class RecognitionPipeline:
+    """
+    Runs any number of video sources through one shared detection pool.
+
+    label(encodings) turns face encodings into names. It is called once per
+    dispatch round with the faces from every source that needed full
+    detection, so the gallery matcher sees one batch instead of one call per
+    frame. Faces are found on frames scaled down by scale; locations are
+    scaled back up here. With track, faces are followed between detections.
+    """
+
+    def __init__(self, sources, label, scale=0.25, track=True, workers=None):
+        self.sources = list(sources)
+        self.label = label
+        self.scale = scale
+        self.workers = workers or min(len(self.sources), os.cpu_count() or 1)
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        if track:
+            for source in self.sources:
+                source.tracker = FaceTracker()
+
+    @property
+    def ended(self):
+        return self.error is not None or all(source.ended for source in self.sources)
+
+    def start(self):
+        self._executor = spawn_pool(self.workers)
+        for source in self.sources:
+            source.start(self._stop)
+        self._thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for source in self.sources:
+            source.join()
+            source.capture.release()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _dispatch_loop(self):
+        try:
+            while not self._stop.is_set():
+                frames = []
+                for source in self.sources:
+                    try:
+                        frames.append((source, source.frames_for_detection.get_nowait()))
+                    except queue.Empty:
+                        pass
+                if frames:
+                    self._process_round(frames)
+                else:
+                    self._stop.wait(0.005)
+        except Exception as e:
+            self.error = e
+
+    def _process_round(self, frames):
+        started = time.monotonic()
+        results = []
+        to_detect = []
+        for source, frame in frames:
+            small_frame = cv2.resize(frame.image, (0, 0), fx=self.scale, fy=self.scale)
+            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+            tracked = source.tracker.follow(rgb_small_frame) if source.tracker is not None else None
+            if tracked is None:
+                to_detect.append((source, frame, rgb_small_frame))
+            else:
+                results.append((source, frame, *tracked))
+
+        if to_detect:
+            detected = list(self._executor.map(detect_and_encode, [rgb for _, _, rgb in to_detect]))
+            encodings = [encoding for _, frame_encodings in detected for encoding in frame_encodings]
+            names = self.label(encodings) if encodings else []
+            start = 0
+            for (source, frame, _), (locations, frame_encodings) in zip(to_detect, detected):
+                frame_names = names[start:start + len(frame_encodings)]
+                start += len(frame_encodings)
+                if source.tracker is not None:
+                    source.tracker.reset(locations, frame_names)
+                results.append((source, frame, locations, frame_names))
+
+        finished = time.monotonic()
+        for source, frame, locations, names in results:
+            # Scale back up face locations since we scaled down the image
+            locations = [tuple(int(v / self.scale) for v in location) for location in locations]
+            source.stats["detect"].tick(finished - started)
+            source.detections.put(Detections(frame.number, frame.captured, locations, names))
+
+    def status(self):
+        return " || ".join(source.status() for source in self.sources)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure face pipeline throughput per video source.")
+    parser.add_argument("sources", nargs="+", help="device indices, stream URLs or video files")
+    parser.add_argument("--store", default="face_store", help="encodings store to match against")
+    parser.add_argument("--no-track", action="store_true", help="run full detection on every frame")
+    parser.add_argument("-j", "--workers", type=int, help="detection processes (default: one per source)")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between reports")
+    args = parser.parse_args(argv)
+
+    from face_gallery import GalleryMatcher
+    from face_store import EncodingStore
+
+    matcher = GalleryMatcher()
+    store = EncodingStore(args.store)
+    if store.exists():
+        store.load()
+        matcher.set_gallery(store.main_encodings, store.names, fingerprint=store.fingerprint,
+                            appended=store.appended_encodings)
+
+    def label(encodings):
+        return [matches[0][0] if matches else "Unknown" for matches in matcher.match(encodings)]
+
+    pipeline = RecognitionPipeline([open_source(spec) for spec in args.sources], label,
+                                   track=not args.no_track, workers=args.workers)
+    pipeline.start()
+    try:
+        while not pipeline.ended:
+            time.sleep(args.interval)
+            for source in pipeline.sources:
+                print(source.status())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+    if pipeline.error is not None:
+        raise pipeline.error
+
+
+if __name__ == "__main__":
+    main()
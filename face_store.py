@@ -0,0 +1,236 @@
+"""
+On-disk store for the known face encodings of the Face Recognition System.
+
+The store is a folder holding one generation of the gallery:
+
+    store.json            generation, row count and the interned name table
+    encodings.<gen>.npy   (rows, 128) float32 matrix, memory-mapped at load
+    ids.<gen>.npy         int32 name id for each row
+    sources.<gen>.json    dataset path of each row, only read when training
+    append.<gen>.f32      raw float32 rows enrolled since the last compaction
+    append.<gen>.jsonl    one {"name", "source"} line per appended row
+
+Loading maps the matrix rather than reading it, so startup does not slow down
+as the gallery grows, and every process that opens the store shares the same
+pages. New enrollments go to the append segment, which is loaded as a small
+separate matrix rather than joined to the main one; once it grows past a
+fraction of the main matrix everything is compacted into a new generation.
+A new generation only becomes visible when store.json is replaced, so readers
+never see half a gallery. There is one writer at a time.
+"""
+
+import json
+import os
+import pickle
+
+import numpy as np
+
+from face_gallery import ENCODING_SIZE, _as_matrix
+
+ROW_BYTES = ENCODING_SIZE * 4
+
+# Compact once the append segment holds this many rows, or a quarter of the
+# main matrix if that is larger
+COMPACT_MIN_ROWS = 1024
+COMPACT_FRACTION = 0.25
+
+
+class EncodingStore:
+    def __init__(self, folder):
+        self.folder = folder
+        self.meta_path = os.path.join(folder, "store.json")
+        self.generation = 0
+        self.token = None
+        self.name_table = []
+        self.main_encodings = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self.appended_encodings = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int32)
+        self.names = []
+        self._main_rows = 0
+        self._sources = None
+        self._appended = []
+        self._append_log_size = 0
+
+    def _file(self, kind, extension, generation=None):
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.folder, f"{kind}.{generation}.{extension}")
+
+    def exists(self):
+        return os.path.exists(self.meta_path)
+
+    def _load_if_needed(self):
+        # Writers work from the current generation, so make sure it is loaded
+        if self.token is None and self.exists():
+            self.load()
+
+    @property
+    def fingerprint(self):
+        """
+        Identifies the main matrix without reading it. Appended rows do not
+        change it, so an index saved for the main matrix stays valid.
+        """
+        return f"{self.token}:{self._main_rows}"
+
+    @property
+    def encodings(self):
+        """
+        Every row as one matrix. With a non-empty append segment this copies
+        the main matrix, so matching uses main_encodings and
+        appended_encodings instead.
+        """
+        if len(self.appended_encodings) == 0:
+            return self.main_encodings
+        return np.concatenate([self.main_encodings, self.appended_encodings])
+
+    @property
+    def sources(self):
+        if self._sources is None:
+            sources = []
+            if self._main_rows:
+                with open(self._file("sources", "json"), "r") as f:
+                    sources = json.load(f)
+            self._sources = sources + [entry["source"] for entry in self._appended]
+        return self._sources
+
+    def load(self):
+        """Map the current generation and read its append segment."""
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        self.generation = meta["generation"]
+        self.token = meta["token"]
+        self.name_table = list(meta["names"])
+        self._main_rows = meta["rows"]
+        self._sources = None
+
+        if self._main_rows:
+            matrix = np.load(self._file("encodings", "npy"), mmap_mode="r")
+            ids = np.load(self._file("ids", "npy"), mmap_mode="r")
+        else:
+            matrix = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+            ids = np.empty(0, dtype=np.int32)
+
+        # A torn last line or a short last row from an interrupted append is ignored
+        self._appended = []
+        line_sizes = []
+        try:
+            with open(self._file("append", "jsonl"), "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._appended.append(json.loads(line))
+                    line_sizes.append(len(line))
+        except FileNotFoundError:
+            pass
+
+        appended = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        if self._appended:
+            raw = np.fromfile(self._file("append", "f32"), dtype=np.float32,
+                              count=len(self._appended) * ENCODING_SIZE)
+            rows = len(raw) // ENCODING_SIZE
+            del self._appended[rows:]
+            appended = raw[:rows * ENCODING_SIZE].reshape(rows, ENCODING_SIZE)
+            # Only the name ids are joined; they are a small fraction of the matrix
+            ids = np.concatenate([ids, self._intern([entry["name"] for entry in self._appended])])
+
+        self._append_log_size = sum(line_sizes[:len(self._appended)])
+        self.main_encodings = matrix
+        self.appended_encodings = appended
+        self.ids = ids
+        self.names = [self.name_table[i] for i in ids.tolist()]
+
+    def _intern(self, names):
+        """Name ids for names, adding unseen names to the table."""
+        lookup = {name: i for i, name in enumerate(self.name_table)}
+        ids = np.empty(len(names), dtype=np.int32)
+        for row, name in enumerate(names):
+            if name not in lookup:
+                lookup[name] = len(self.name_table)
+                self.name_table.append(name)
+            ids[row] = lookup[name]
+        return ids
+
+    def save(self, encodings, names, sources):
+        """Write the whole gallery as a new generation and switch to it."""
+        self._load_if_needed()
+        os.makedirs(self.folder, exist_ok=True)
+        old_generation = self.generation if self.exists() else None
+        generation = self.generation + 1
+        matrix = _as_matrix(encodings)
+
+        self.name_table = []
+        ids = self._intern(list(names))
+        np.save(self._file("encodings", "npy", generation), matrix)
+        np.save(self._file("ids", "npy", generation), ids)
+        with open(self._file("sources", "json", generation), "w") as f:
+            json.dump(list(sources), f)
+
+        meta = {"generation": generation, "token": os.urandom(8).hex(),
+                "rows": len(matrix), "names": self.name_table}
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self.meta_path)
+
+        # Readers that still have the old matrix mapped keep their copy
+        if old_generation is not None:
+            for kind, extension in (("encodings", "npy"), ("ids", "npy"), ("sources", "json"),
+                                    ("append", "f32"), ("append", "jsonl")):
+                try:
+                    os.remove(self._file(kind, extension, old_generation))
+                except OSError:
+                    pass
+        self.load()
+
+    def append(self, encodings, names, sources):
+        """Add enrollments without rewriting the main matrix."""
+        self._load_if_needed()
+        if not self.exists():
+            self.save(encodings, names, sources)
+            return
+        matrix = _as_matrix(encodings)
+        if len(matrix) == 0:
+            return
+
+        # Drop whatever an interrupted append left past the last complete row
+        with open(self._file("append", "f32"), "ab") as f:
+            f.truncate(len(self._appended) * ROW_BYTES)
+            f.write(matrix.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._file("append", "jsonl"), "ab") as f:
+            f.truncate(self._append_log_size)
+            for name, source in zip(names, sources):
+                f.write((json.dumps({"name": name, "source": source}) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.load()
+        if len(self._appended) > max(COMPACT_MIN_ROWS, self._main_rows * COMPACT_FRACTION):
+            self.compact()
+
+    def compact(self):
+        """Fold the append segment into a new generation of the main matrix."""
+        self.save(self.encodings, self.names, self.sources)
+
+    def update(self, encodings, names, sources):
+        """
+        Store a retrained gallery, appending if it only grew.
+
+        The gallery only grew if the stored rows are an unchanged prefix of
+        the new ones, which is what incremental training produces when no
+        image was changed or removed.
+        """
+        self._load_if_needed()
+        known = self.sources if self.exists() else []
+        if list(sources[:len(known)]) == known:
+            start = len(known)
+            self.append(encodings[start:], names[start:], sources[start:])
+        else:
+            self.save(encodings, names, sources)
+
+    def import_pickle(self, path):
+        """Convert a face_encodings.pkl from older versions into the store."""
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        names = data["names"]
+        self.save(data["encodings"], names, data.get("sources", [""] * len(names)))
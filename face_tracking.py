@@ -0,0 +1,108 @@
+"""
+Face tracking between detections for the Face Recognition System.
+
+Detecting and encoding faces is by far the most expensive part of the webcam
+loop. FaceTracker runs it only every few frames, or sooner when the scene
+changes or a face is lost. In between it follows each face by template
+matching in a small window around its last position, and keeps the name it
+was given at the last detection.
+"""
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# One followed face: box as (top, right, bottom, left), its name, and the
+# grayscale patch it is matched by
+Track = namedtuple("Track", ["box", "name", "template"])
+
+# Size of the thumbnail used to notice scene changes
+SCENE_THUMBNAIL = (32, 24)
+
+
+class FaceTracker:
+    """
+    Follows the faces of one video source between full detections.
+
+    Give every frame to follow(). It returns the tracked boxes and names, or
+    None when full detection is due; then detect the faces in that frame and
+    pass them to reset(). Full detection is due every redetect_every frames,
+    when more than scene_change of the scene thumbnail differs from the last
+    detection by more than pixel_change gray levels, or when a face can no
+    longer be matched with a score of at least min_score.
+    """
+
+    def __init__(self, redetect_every=15, scene_change=0.02, pixel_change=25, min_score=0.6):
+        self.redetect_every = redetect_every
+        self.scene_change = scene_change
+        self.pixel_change = pixel_change
+        self.min_score = min_score
+        self.tracks = []
+        self.frames_since_detection = None
+        self.detected_frames = 0
+        self.tracked_frames = 0
+        self._scene = None
+        self._frame = None
+
+    def follow(self, rgb_image):
+        """Return (boxes, names) for this frame, or None if it needs full detection."""
+        gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+        scene = cv2.resize(gray, SCENE_THUMBNAIL, interpolation=cv2.INTER_AREA).astype(np.int16)
+        self._frame = (gray, scene)
+
+        if self._needs_detection(scene):
+            return None
+        boxes = [self._follow(gray, track) for track in self.tracks]
+        if any(box is None for box in boxes):
+            return None
+        self.tracks = [track._replace(box=box) for track, box in zip(self.tracks, boxes)]
+        self.frames_since_detection += 1
+        self.tracked_frames += 1
+        return boxes, [track.name for track in self.tracks]
+
+    def reset(self, locations, names):
+        """Track the faces found by full detection of the frame last given to follow()."""
+        gray, scene = self._frame
+        self.tracks = [Track(tuple(location), name, self._crop(gray, location))
+                       for location, name in zip(locations, names)]
+        self._scene = scene
+        self.frames_since_detection = 0
+        self.detected_frames += 1
+
+    def _needs_detection(self, scene):
+        if self.frames_since_detection is None or self.frames_since_detection + 1 >= self.redetect_every:
+            return True
+        changed = np.abs(scene - self._scene) > self.pixel_change
+        return changed.mean() > self.scene_change
+
+    @staticmethod
+    def _crop(gray, box):
+        top, right, bottom, left = box
+        return gray[max(0, top):bottom, max(0, left):right].copy()
+
+    def _follow(self, gray, track):
+        """New box for a track, or None if the face was lost."""
+        top, right, bottom, left = track.box
+        height, width = track.template.shape
+        if height == 0 or width == 0:
+            return None
+
+        # Search a window half a face wider than the box on every side
+        margin = max(height, width) // 2
+        y0, x0 = max(0, top - margin), max(0, left - margin)
+        window = gray[y0:bottom + margin, x0:right + margin]
+        if window.shape[0] < height or window.shape[1] < width:
+            return None
+
+        result = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if not np.isfinite(score) or score < self.min_score:
+            return None
+        return (y0 + y, x0 + x + width, y0 + y + height, x0 + x)
+
+    @property
+    def detection_share(self):
+        """Fraction of frames that needed full detection."""
+        total = self.detected_frames + self.tracked_frames
+        return self.detected_frames / total if total else 0.0
@@ -0,0 +1,44 @@
+"""
+Worker processes for the Face Recognition System.
+
+Training, the video pipeline and batch recognition all hand face detection
+and encoding to a pool of processes. Pools are started with spawn rather
+than fork: the caller is usually a Tk app with live threads, and a forked
+child would inherit their locks in whatever state they were in.
+"""
+
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+_END = object()
+
+
+def spawn_pool(workers=None):
+    """A ProcessPoolExecutor whose workers start as fresh interpreters."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def completed_in_window(executor, fn, items, window, *args):
+    """
+    Run fn(item, *args) on the executor for every item and yield (item, future)
+    as each finishes.
+
+    No more than window items are submitted and unfinished at once, and items
+    are only pulled from the iterable as room frees up, so a long stream of
+    inputs never piles up as futures.
+    """
+    items = iter(items)
+    pending = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < window:
+            item = next(items, _END)
+            if item is _END:
+                exhausted = True
+            else:
+                pending[executor.submit(fn, item, *args)] = item
+        if not pending:
+            return
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            yield pending.pop(future), future
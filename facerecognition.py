@@ -1,12 +1,16 @@
 import cv2
 import face_recognition
-import numpy as np
 import os
-import pickle
+import threading
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
+
+from face_dataset import DatasetCatalog, TrainingManifest, incremental_train
+from face_display import DisplaySurface
+from face_gallery import INDEX_TYPES, GalleryMatcher
+from face_pipeline import RecognitionPipeline, draw_labels, open_source, tile_frames
+from face_store import EncodingStore
 
 class FaceRecognitionSystem:
     def __init__(self, root):
@@ -16,24 +20,28 @@ class FaceRecognitionSystem:
         self.root.configure(bg="#f0f0f0")
         
         # Initialize variables
-        self.known_face_encodings = []
         self.known_face_names = []
+        self.matcher = GalleryMatcher(index_file="face_index.npz")
         self.face_locations = []
-        self.face_encodings = []
         self.face_names = []
-        self.process_current_frame = True
         self.current_image = None
-        self.video_capture = None
+        self.webcam_pipeline = None
+        self.webcam_tolerance = 0.6
+        self.source_images = []
+        self.shown_detections = []
         self.is_webcam_active = False
         self.dataset_folder = "face_dataset"
+        self.store = EncodingStore("face_store")
+        # Only read to convert galleries saved by older versions
         self.encodings_file = "face_encodings.pkl"
+        self.manifest_file = "face_training_manifest.json"
         
         # Create dataset folder if it doesn't exist
         if not os.path.exists(self.dataset_folder):
             os.makedirs(self.dataset_folder)
         
-        # Load existing encodings if available
-        self.load_encodings()
+        # Image counts per person, so refreshing the views does not list the dataset
+        self.catalog = DatasetCatalog(self.dataset_folder, "face_dataset_catalog.json")
         
         # Create main frame
         self.main_frame = ttk.Frame(self.root, padding=20)
@@ -62,6 +70,9 @@ class FaceRecognitionSystem:
         self.status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
+        # Load existing encodings if available
+        self.load_encodings()
+        
         # Bind closing event
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
     
@@ -80,11 +91,20 @@ class FaceRecognitionSystem:
         webcam_frame = ttk.LabelFrame(controls_frame, text="Webcam", padding=10)
         webcam_frame.pack(fill=tk.X, pady=10)
         
+        ttk.Label(webcam_frame, text="Sources (comma separated):").pack(anchor=tk.W)
+        self.sources_var = tk.StringVar(value="0")
+        ttk.Entry(webcam_frame, textvariable=self.sources_var).pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(webcam_frame, text="Camera numbers, stream URLs or video files").pack(anchor=tk.W)
+        
         self.webcam_btn = ttk.Button(webcam_frame, text="Start Webcam", command=self.toggle_webcam)
         self.webcam_btn.pack(fill=tk.X, pady=5)
         
         ttk.Button(webcam_frame, text="Take Screenshot", command=self.take_screenshot).pack(fill=tk.X, pady=5)
         
+        self.track_faces_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(webcam_frame, text="Track faces between detections",
+                       variable=self.track_faces_var).pack(anchor=tk.W, pady=5)
+        
         # Image controls
         image_frame = ttk.LabelFrame(controls_frame, text="Image Recognition", padding=10)
         image_frame.pack(fill=tk.X, pady=10)
@@ -102,12 +122,21 @@ class FaceRecognitionSystem:
         tolerance_scale.pack(fill=tk.X, pady=5)
         ttk.Label(settings_frame, textvariable=tk.StringVar(value="Lower = More strict, Higher = More permissive")).pack()
         
+        ttk.Label(settings_frame, text="Gallery Index:").pack(anchor=tk.W, pady=(10, 0))
+        self.index_var = tk.StringVar(value=self.matcher.index_kind)
+        self.index_combo = ttk.Combobox(settings_frame, textvariable=self.index_var, state="readonly",
+                                        values=list(INDEX_TYPES))
+        self.index_combo.pack(fill=tk.X, pady=5)
+        self.index_combo.bind("<<ComboboxSelected>>", lambda e: self.change_index(self.index_var.get()))
+        ttk.Label(settings_frame, text="brute = exact, ivf / centroid = faster for large galleries").pack()
+        
         # Display area
         ttk.Label(display_frame, text="Recognition Display", font=("Segoe UI", 14, "bold")).pack(pady=(0, 10))
         
         # Canvas for image/video display
         self.canvas = tk.Canvas(display_frame, bg="black")
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.display = DisplaySurface(self.canvas)
         
         # Recognition info
         self.info_text = tk.Text(display_frame, height=5, wrap=tk.WORD)
@@ -151,6 +180,7 @@ class FaceRecognitionSystem:
         
         ttk.Button(manage_frame, text="View Dataset", command=self.view_dataset).pack(fill=tk.X, pady=5)
         ttk.Button(manage_frame, text="Remove Person", command=self.remove_person).pack(fill=tk.X, pady=5)
+        ttk.Button(manage_frame, text="Rescan Dataset Folder", command=self.rescan_dataset).pack(fill=tk.X, pady=5)
         
         # Display area
         ttk.Label(display_frame, text="Dataset Preview", font=("Segoe UI", 14, "bold")).pack(pady=(0, 10))
@@ -163,8 +193,8 @@ class FaceRecognitionSystem:
         self.dataset_tree.column("images", width=150)
         self.dataset_tree.pack(fill=tk.BOTH, expand=True)
         
-        # Refresh the dataset view
-        self.view_dataset()
+        # Fill the dataset view (the training stats are not built yet)
+        self.refresh_dataset_tree()
     
     def setup_training_tab(self):
         # Center content
@@ -201,24 +231,49 @@ It's recommended to train after adding or removing images."""
         self.update_training_stats()
     
     def load_encodings(self):
-        if os.path.exists(self.encodings_file):
-            try:
-                with open(self.encodings_file, "rb") as f:
-                    data = pickle.load(f)
-                    self.known_face_encodings = data["encodings"]
-                    self.known_face_names = data["names"]
-                self.status_var.set(f"Loaded {len(self.known_face_encodings)} face encodings")
-            except Exception as e:
-                self.status_var.set(f"Error loading encodings: {str(e)}")
-    
-    def save_encodings(self):
         try:
-            with open(self.encodings_file, "wb") as f:
-                data = {"encodings": self.known_face_encodings, "names": self.known_face_names}
-                pickle.dump(data, f)
-            self.status_var.set(f"Saved {len(self.known_face_encodings)} face encodings")
+            if not self.store.exists() and os.path.exists(self.encodings_file):
+                self.store.import_pickle(self.encodings_file)
+            if self.store.exists():
+                # Maps the matrix, so this stays quick however large the gallery is
+                self.store.load()
+                self.refresh_gallery()
+                self.status_var.set(f"Loaded {len(self.known_face_names)} face encodings")
         except Exception as e:
-            self.status_var.set(f"Error saving encodings: {str(e)}")
+            self.status_var.set(f"Error loading encodings: {str(e)}")
+    
+    def refresh_gallery(self):
+        self.known_face_names = self.store.names
+        # The main matrix stays memory-mapped; recent enrollments are searched beside it
+        self.matcher.set_gallery(self.store.main_encodings, self.store.names,
+                                 fingerprint=self.store.fingerprint,
+                                 appended=self.store.appended_encodings)
+    
+    def change_index(self, kind):
+        if kind == self.matcher.index_kind:
+            return
+        # Building an index over a large gallery takes seconds; recognition
+        # keeps using the current one until the new one is swapped in
+        self.index_combo.config(state=tk.DISABLED)
+        self.status_var.set(f"Building {kind} index for {len(self.matcher)} face encodings...")
+        
+        def finish(error=None):
+            self.index_combo.config(state="readonly")
+            self.index_var.set(self.matcher.index_kind)
+            if error:
+                self.status_var.set(f"Error building {kind} index: {error}")
+            else:
+                self.status_var.set(f"Using {kind} index")
+        
+        def build_thread():
+            try:
+                self.matcher.set_index(kind)
+            except Exception as e:
+                self.root.after(0, finish, str(e))
+                return
+            self.root.after(0, finish)
+        
+        threading.Thread(target=build_thread, daemon=True).start()
     
     def toggle_webcam(self):
         if self.is_webcam_active:
@@ -226,89 +281,103 @@ It's recommended to train after adding or removing images."""
             self.webcam_btn.config(text="Start Webcam")
         else:
             self.start_webcam()
-            self.webcam_btn.config(text="Stop Webcam")
+            if self.is_webcam_active:
+                self.webcam_btn.config(text="Stop Webcam")
     
     def start_webcam(self):
-        self.video_capture = cv2.VideoCapture(0)
-        if not self.video_capture.isOpened():
-            messagebox.showerror("Error", "Could not open webcam")
+        specs = [spec.strip() for spec in self.sources_var.get().split(",") if spec.strip()]
+        sources = []
+        try:
+            for spec in specs:
+                sources.append(open_source(spec))
+        except OSError as e:
+            for source in sources:
+                source.capture.release()
+            messagebox.showerror("Error", str(e))
+            return
+        if not sources:
+            messagebox.showerror("Error", "No video source given")
             return
         
+        # Capture and detection run off the Tk thread; update_webcam renders
+        self.webcam_tolerance = self.tolerance_var.get()
+        self.webcam_pipeline = RecognitionPipeline(
+            sources, lambda encodings: self.label_faces(encodings, self.webcam_tolerance),
+            track=self.track_faces_var.get())
+        self.webcam_pipeline.start()
+        self.source_images = [None] * len(sources)
+        self.shown_detections = [-1] * len(sources)
         self.is_webcam_active = True
         self.update_webcam()
         self.status_var.set("Webcam active")
     
     def stop_webcam(self):
         self.is_webcam_active = False
-        if self.video_capture is not None:
-            self.video_capture.release()
-            self.video_capture = None
+        if self.webcam_pipeline is not None:
+            self.webcam_pipeline.stop()
+            self.webcam_pipeline = None
         self.status_var.set("Webcam stopped")
     
     def update_webcam(self):
         if not self.is_webcam_active:
             return
         
-        # Get frame from webcam
-        ret, frame = self.video_capture.read()
-        if not ret:
+        pipeline = self.webcam_pipeline
+        if pipeline.ended:
+            error = pipeline.error
             self.stop_webcam()
+            self.webcam_btn.config(text="Start Webcam")
+            if error is not None:
+                messagebox.showerror("Error", f"Face detection failed: {str(error)}")
             return
         
-        # Only process every other frame to save time
-        if self.process_current_frame:
-            # Resize frame for faster processing
-            small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-            
-            # Find faces
-            self.face_locations = face_recognition.face_locations(rgb_small_frame)
-            self.face_encodings = face_recognition.face_encodings(rgb_small_frame, self.face_locations)
-            
+        # The dispatcher thread reads the tolerance from here
+        self.webcam_tolerance = self.tolerance_var.get()
+        
+        updated = False
+        detections_changed = False
+        for i, source in enumerate(pipeline.sources):
+            image = source.next_frame()
+            if image is not None:
+                self.source_images[i] = image
+                updated = True
+            if source.latest.frame_number != self.shown_detections[i]:
+                self.shown_detections[i] = source.latest.frame_number
+                detections_changed = True
+        
+        if updated:
+            self.current_image = tile_frames([image for image in self.source_images if image is not None])
+            self.display_image(self.current_image)
+            self.status_var.set(pipeline.status())
+        
+        # Only rewrite the info panel when there are new detections
+        if detections_changed:
+            self.face_locations = []
             self.face_names = []
-            for face_encoding in self.face_encodings:
-                # See if the face is a match for known faces
-                matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, 
-                                                        tolerance=self.tolerance_var.get())
-                name = "Unknown"
-                
-                # Use the distance to find the best match
-                if len(self.known_face_encodings) > 0:
-                    face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        name = self.known_face_names[best_match_index]
-                        confidence = 1 - face_distances[best_match_index]
-                        name = f"{name} ({confidence:.2%})"
-                
-                self.face_names.append(name)
-        
-        self.process_current_frame = not self.process_current_frame
-        
-        # Display results
-        for (top, right, bottom, left), name in zip(self.face_locations, self.face_names):
-            # Scale back up face locations since we scaled down the image
-            top *= 4
-            right *= 4
-            bottom *= 4
-            left *= 4
-            
-            # Draw box and label
-            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-            cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
-            font = cv2.FONT_HERSHEY_DUPLEX
-            cv2.putText(frame, name, (left + 6, bottom - 6), font, 0.8, (255, 255, 255), 1)
-        
-        # Convert to RGB for tkinter
-        self.current_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        self.display_image(self.current_image)
-        
-        # Update recognition info
-        self.update_recognition_info()
+            for source in pipeline.sources:
+                self.face_locations.extend(source.latest.locations)
+                if len(pipeline.sources) > 1:
+                    self.face_names.extend(f"{name} [{source.name}]" for name in source.latest.names)
+                else:
+                    self.face_names.extend(source.latest.names)
+            self.update_recognition_info()
         
         # Continue updating
         self.root.after(10, self.update_webcam)
     
+    def label_faces(self, face_encodings, tolerance=None):
+        # Match every face against the whole gallery in one batched pass
+        if tolerance is None:
+            tolerance = self.tolerance_var.get()
+        face_names = []
+        for matches in self.matcher.match(face_encodings, tolerance=tolerance):
+            if matches:
+                name, distance = matches[0]
+                face_names.append(f"{name} ({1 - distance:.2%})")
+            else:
+                face_names.append("Unknown")
+        return face_names
+    
     def take_screenshot(self):
         if self.current_image is not None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -350,31 +419,10 @@ It's recommended to train after adding or removing images."""
         face_locations = face_recognition.face_locations(rgb_image)
         face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
         
-        face_names = []
-        for face_encoding in face_encodings:
-            # See if the face is a match for known faces
-            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, 
-                                                    tolerance=self.tolerance_var.get())
-            name = "Unknown"
-            
-            # Use the distance to find the best match
-            if len(self.known_face_encodings) > 0:
-                face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    name = self.known_face_names[best_match_index]
-                    confidence = 1 - face_distances[best_match_index]
-                    name = f"{name} ({confidence:.2%})"
-            
-            face_names.append(name)
+        face_names = self.label_faces(face_encodings)
         
         # Display results
-        for (top, right, bottom, left), name in zip(face_locations, face_names):
-            # Draw box and label
-            cv2.rectangle(image, (left, top), (right, bottom), (0, 255, 0), 2)
-            cv2.rectangle(image, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
-            font = cv2.FONT_HERSHEY_DUPLEX
-            cv2.putText(image, name, (left + 6, bottom - 6), font, 0.8, (255, 255, 255), 1)
+        draw_labels(image, face_locations, face_names)
         
         # Display the result
         self.current_image = image
@@ -388,29 +436,8 @@ It's recommended to train after adding or removing images."""
         self.status_var.set(f"Recognized {len(face_locations)} faces")
     
     def display_image(self, image):
-        # Get canvas size
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-        
-        if canvas_width <= 1:  # Not initialized yet
-            canvas_width = 640
-            canvas_height = 480
-        
-        # Resize image to fit canvas while preserving aspect ratio
-        height, width = image.shape[:2]
-        scale = min(canvas_width / width, canvas_height / height)
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        
-        resized_image = cv2.resize(image, (new_width, new_height))
-        
-        # Convert to PhotoImage
-        photo_image = ImageTk.PhotoImage(image=Image.fromarray(resized_image))
-        
-        # Update canvas
-        self.canvas.config(width=new_width, height=new_height)
-        self.canvas.create_image(new_width // 2, new_height // 2, image=photo_image)
-        self.canvas.image = photo_image  # Keep a reference
+        # Reuses one canvas item and buffer, so long webcam sessions do not grow
+        self.display.show(image)
     
     def update_recognition_info(self):
         # Update info text
@@ -463,7 +490,9 @@ It's recommended to train after adding or removing images."""
         # Save image
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         image_path = os.path.join(person_dir, f"{timestamp}.jpg")
-        cv2.imwrite(image_path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        is_new = not os.path.exists(image_path)
+        if cv2.imwrite(image_path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR)) and is_new:
+            self.catalog.add_images(name, 1)
         
         self.status_var.set(f"Added image for {name}")
         messagebox.showinfo("Success", f"Image added to dataset for {name}")
@@ -492,6 +521,7 @@ It's recommended to train after adding or removing images."""
         
         # Save each image
         count = 0
+        new_images = 0
         for filename in filenames:
             try:
                 image = cv2.imread(filename)
@@ -500,10 +530,14 @@ It's recommended to train after adding or removing images."""
                 
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") + f"_{count}"
                 image_path = os.path.join(person_dir, f"{timestamp}.jpg")
-                cv2.imwrite(image_path, image)
+                is_new = not os.path.exists(image_path)
+                if not cv2.imwrite(image_path, image):
+                    continue
                 count += 1
+                new_images += is_new
             except Exception as e:
                 print(f"Error processing {filename}: {str(e)}")
+        self.catalog.add_images(name, new_images)
         
         self.status_var.set(f"Added {count} images for {name}")
         messagebox.showinfo("Success", f"Added {count} images to dataset for {name}")
@@ -512,27 +546,26 @@ It's recommended to train after adding or removing images."""
         self.view_dataset()
     
     def view_dataset(self):
+        self.refresh_dataset_tree()
+        
+        # Update stats
+        self.update_training_stats()
+    
+    def refresh_dataset_tree(self):
         # Clear the treeview
         for item in self.dataset_tree.get_children():
             self.dataset_tree.delete(item)
         
-        # Get list of people in dataset
-        if not os.path.exists(self.dataset_folder):
-            return
-        
-        people = [d for d in os.listdir(self.dataset_folder) 
-                 if os.path.isdir(os.path.join(self.dataset_folder, d))]
-        
-        # Add to treeview
-        for person in people:
-            person_dir = os.path.join(self.dataset_folder, person)
-            images = [f for f in os.listdir(person_dir) 
-                     if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
-            
-            self.dataset_tree.insert("", tk.END, values=(person, len(images)))
-        
-        # Update stats
-        self.update_training_stats()
+        # Add to treeview, straight from the catalog
+        for person, count in sorted(self.catalog.people.items()):
+            self.dataset_tree.insert("", tk.END, values=(person, count))
+    
+    def rescan_dataset(self):
+        # Picks up images added or deleted outside the app
+        self.catalog.rescan()
+        self.view_dataset()
+        self.status_var.set(f"Rescanned dataset: {self.catalog.people_count} people, "
+                            f"{self.catalog.image_count} images")
     
     def remove_person(self):
         selected_items = self.dataset_tree.selection()
@@ -555,6 +588,7 @@ It's recommended to train after adding or removing images."""
                 os.remove(os.path.join(person_dir, file))
             # Delete directory
             os.rmdir(person_dir)
+            self.catalog.remove_person(person)
             
             self.status_var.set(f"Removed {person} from dataset")
             messagebox.showinfo("Success", f"Removed {person} from dataset")
@@ -565,25 +599,11 @@ It's recommended to train after adding or removing images."""
             messagebox.showerror("Error", f"Failed to remove: {str(e)}")
     
     def update_training_stats(self):
-        people_count = 0
-        images_count = 0
-        
-        if os.path.exists(self.dataset_folder):
-            people = [d for d in os.listdir(self.dataset_folder) 
-                     if os.path.isdir(os.path.join(self.dataset_folder, d))]
-            people_count = len(people)
-            
-            for person in people:
-                person_dir = os.path.join(self.dataset_folder, person)
-                images = [f for f in os.listdir(person_dir) 
-                         if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
-                images_count += len(images)
-        
-        self.people_count_var.set(f"People: {people_count}")
-        self.images_count_var.set(f"Images: {images_count}")
+        self.people_count_var.set(f"People: {self.catalog.people_count}")
+        self.images_count_var.set(f"Images: {self.catalog.image_count}")
         
-        if os.path.exists(self.encodings_file):
-            mod_time = os.path.getmtime(self.encodings_file)
+        if self.store.exists():
+            mod_time = os.path.getmtime(self.store.meta_path)
             mod_time_str = datetime.fromtimestamp(mod_time).strftime("%Y-%m-%d %H:%M:%S")
             self.last_trained_var.set(f"Last trained: {mod_time_str}")
         else:
@@ -594,23 +614,13 @@ It's recommended to train after adding or removing images."""
             messagebox.showerror("Error", "Dataset folder does not exist")
             return
         
-        people = [d for d in os.listdir(self.dataset_folder) 
-                 if os.path.isdir(os.path.join(self.dataset_folder, d))]
-        
-        if not people:
+        if not self.catalog.people:
             messagebox.showerror("Error", "No people in dataset")
             return
         
         # Ask for confirmation
-        images_count = 0
-        for person in people:
-            person_dir = os.path.join(self.dataset_folder, person)
-            images = [f for f in os.listdir(person_dir) 
-                     if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
-            images_count += len(images)
-        
         if not messagebox.askyesno("Confirm", 
-                                  f"Train model with {len(people)} people and {images_count} images?\nThis may take some time."):
+                                  f"Train model with {self.catalog.people_count} people and {self.catalog.image_count} images?\nOnly new or changed images will be encoded."):
             return
         
         # Show progress window
@@ -623,60 +633,46 @@ It's recommended to train after adding or removing images."""
         ttk.Label(progress_window, text="Training face recognition model...").pack(pady=10)
         
         progress_var = tk.DoubleVar()
-        progress_bar = ttk.Progressbar(progress_window, variable=progress_var, maximum=images_count)
+        progress_bar = ttk.Progressbar(progress_window, variable=progress_var, maximum=100)
         progress_bar.pack(fill=tk.X, padx=20, pady=10)
         
-        status_var = tk.StringVar(value="Starting...")
+        status_var = tk.StringVar(value="Checking for new or changed images...")
         status_label = ttk.Label(progress_window, textvariable=status_var)
         status_label.pack(pady=10)
         
-        # Reset encodings
-        self.known_face_encodings = []
-        self.known_face_names = []
+        def report_progress(done, total):
+            progress_var.set(done * 100 / total)
+            status_var.set(f"Encoding new or changed images: {done}/{total}")
         
-        # Process each person in a separate thread
+        def finish(encoded, error=None):
+            progress_window.destroy()
+            if error:
+                messagebox.showerror("Error", f"Training failed: {error}")
+                return
+            self.update_training_stats()
+            messagebox.showinfo("Success", f"Training complete! Encoded {encoded} new or changed images.")
+        
+        # Images are encoded on a process pool; this thread just waits on it
         def training_thread():
-            processed = 0
-            for person in people:
-                person_dir = os.path.join(self.dataset_folder, person)
-                image_files = [f for f in os.listdir(person_dir) 
-                              if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
+            try:
+                manifest = TrainingManifest(self.manifest_file)
+                encodings, names, sources, encoded = incremental_train(
+                    self.dataset_folder, self.store.encodings, self.known_face_names,
+                    self.store.sources, manifest,
+                    progress=lambda done, total: self.root.after(0, report_progress, done, total))
                 
-                for image_file in image_files:
-                    image_path = os.path.join(person_dir, image_file)
-                    
-                    # Update progress
-                    progress_var.set(processed)
-                    status_var.set(f"Processing {person}: {image_file}")
-                    
-                    try:
-                        # Load image
-                        image = face_recognition.load_image_file(image_path)
-                        
-                        # Find face encodings (using the first face found)
-                        face_encodings = face_recognition.face_encodings(image)
-                        
-                        if face_encodings:
-                            # Add encoding to dataset
-                            self.known_face_encodings.append(face_encodings[0])
-                            self.known_face_names.append(person)
-                    except Exception as e:
-                        print(f"Error processing {image_path}: {str(e)}")
-                    
-                    processed += 1
-            
-            # Save encodings
-            self.save_encodings()
-            
-            # Update stats
-            self.update_training_stats()
+                # Save the encodings before the manifest that describes them. A
+                # gallery that only grew is appended to the store, not rewritten.
+                self.store.update(encodings, names, sources)
+                manifest.save()
+            except Exception as e:
+                self.root.after(0, finish, 0, str(e))
+                return
             
-            # Close progress window
-            progress_window.destroy()
-            messagebox.showinfo("Success", f"Training complete! Processed {processed} images.")
+            self.refresh_gallery()
+            self.root.after(0, finish, encoded)
         
         # Start training in a separate thread
-        import threading
         threading.Thread(target=training_thread, daemon=True).start()
     
     def on_closing(self):
@@ -0,0 +1,793 @@
+"""
+Headless engine for File-Organizer.
+
+Plans and performs the moves that sort files in a directory into folders by
+extension. It has no GUI dependencies so it can be imported by the Tk app or
+run from cron:
+
+    python file_organizer_engine.py ~/Downloads /srv/share --dry-run --plan plan.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import select
+import shutil
+import stat
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_MAPPINGS = {
+    "Images": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"],
+    "Documents": [".doc", ".docx", ".txt", ".pdf", ".xlsx", ".pptx", ".csv", ".rtf"],
+    "Videos": [".mp4", ".mov", ".avi", ".mkv", ".wmv", ".flv"],
+    "Audio": [".mp3", ".wav", ".flac", ".aac", ".ogg", ".m4a"],
+    "Archives": [".zip", ".rar", ".7z", ".tar", ".gz"],
+    "Code": [".py", ".js", ".html", ".css", ".java", ".cpp", ".c", ".php", ".json"]
+}
+
+CONFIG_FILE = os.path.join(os.path.expanduser("~"), "file_organizer_config.json")
+JOURNAL_FILE = os.path.join(os.path.expanduser("~"), "file_organizer_journal.jsonl")
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+DEFAULT_BATCH_SIZE = 256
+
+QUARANTINE_FOLDER = "Duplicates"
+PARTIAL_HASH_BLOCK = 64 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# One planned operation. action is "move", "link" (replace source with a hard
+# link to original, stored at target) or "quarantine" (move into QUARANTINE_FOLDER).
+Move = namedtuple("Move", ["source", "target", "action", "original"], defaults=["move", None])
+
+
+def load_mappings(config_file=CONFIG_FILE):
+    """Return the folder -> extensions mappings, falling back to the defaults."""
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as f:
+            return json.load(f)
+    return {folder: list(extensions) for folder, extensions in DEFAULT_MAPPINGS.items()}
+
+
+def save_mappings(mappings, config_file=CONFIG_FILE):
+    with open(config_file, 'w') as f:
+        json.dump(mappings, f, indent=2)
+
+
+def build_extension_map(mappings):
+    """Flatten the mappings once so each file is a single dict lookup."""
+    extension_map = {}
+    for folder, extensions in mappings.items():
+        for ext in extensions:
+            extension_map.setdefault(ext.lower(), folder)
+    return extension_map
+
+
+class NameIndex:
+    """
+    In-memory view of the file names in each target directory.
+
+    Each directory is listed once with os.scandir the first time it is used,
+    then kept up to date as names are claimed. Conflicts are resolved with a
+    per-stem suffix counter, so picking a free name never touches the disk.
+    """
+
+    def __init__(self):
+        self._names = {}
+        self._next_suffix = {}
+
+    def _names_in(self, directory):
+        names = self._names.get(directory)
+        if names is None:
+            names = set()
+            try:
+                with os.scandir(directory) as entries:
+                    names.update(os.path.normcase(entry.name) for entry in entries)
+            except FileNotFoundError:
+                pass
+            self._names[directory] = names
+        return names
+
+    def claim(self, directory, name):
+        """Reserve a free name in directory, based on name, and return the full path."""
+        names = self._names_in(directory)
+        if os.path.normcase(name) not in names:
+            names.add(os.path.normcase(name))
+            return os.path.join(directory, name)
+
+        base_name, ext = os.path.splitext(name)
+        key = (directory, os.path.normcase(base_name), os.path.normcase(ext))
+        counter = self._next_suffix.get(key, 1)
+        new_name = f"{base_name}_{counter}{ext}"
+        while os.path.normcase(new_name) in names:
+            counter += 1
+            new_name = f"{base_name}_{counter}{ext}"
+
+        self._next_suffix[key] = counter + 1
+        names.add(os.path.normcase(new_name))
+        return os.path.join(directory, new_name)
+
+
+def plan_moves(source_dir, mappings, name_index=None):
+    """
+    Work out where every file directly inside source_dir should go.
+
+    Returns a list of Move tuples. Nothing is touched
+    on disk, so the plan can be reviewed before it is executed. Pass a shared
+    name_index when planning several times against the same target folders.
+    """
+    extension_map = build_extension_map(mappings)
+    if name_index is None:
+        name_index = NameIndex()
+    planned = []
+
+    with os.scandir(source_dir) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+
+            target_folder = extension_map.get(os.path.splitext(entry.name)[1].lower())
+            if not target_folder:
+                continue
+
+            target_path = name_index.claim(os.path.join(source_dir, target_folder), entry.name)
+            planned.append(Move(entry.path, target_path))
+
+    return planned
+
+
+def _partial_hash(path):
+    """Hash the first and last blocks of a file, which covers small files entirely."""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        digest.update(f.read(PARTIAL_HASH_BLOCK))
+        size = os.fstat(f.fileno()).st_size
+        if size > PARTIAL_HASH_BLOCK:
+            f.seek(max(PARTIAL_HASH_BLOCK, size - PARTIAL_HASH_BLOCK))
+            digest.update(f.read(PARTIAL_HASH_BLOCK))
+    return digest.hexdigest()
+
+
+def _full_hash(path):
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _split_by_hash(groups, hash_func, executor):
+    """Refine groups of candidate paths by hash_func, keeping only groups still tied."""
+    paths = [path for group in groups for path in group]
+    hashes = dict(zip(paths, executor.map(hash_func, paths)))
+
+    refined = []
+    for group in groups:
+        by_hash = defaultdict(list)
+        for path in group:
+            by_hash[hashes[path]].append(path)
+        refined.extend(tied for tied in by_hash.values() if len(tied) > 1)
+    return refined
+
+
+def find_duplicates(paths, workers=DEFAULT_WORKERS):
+    """
+    Group identical files among paths.
+
+    Files are compared by size first, then by a hash of their first and last
+    blocks, and only files still tied after that are hashed in full. Returns
+    a list of groups, each in the order the paths were given. Empty files are
+    never reported as duplicates.
+    """
+    by_size = defaultdict(list)
+    for path in paths:
+        size = os.path.getsize(path)
+        if size > 0:
+            by_size[size].append(path)
+
+    candidates = [group for group in by_size.values() if len(group) > 1]
+    if not candidates:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        candidates = _split_by_hash(candidates, _partial_hash, executor)
+
+        # The partial hash already read every byte of files up to two blocks long
+        small, large = [], []
+        for group in candidates:
+            if os.path.getsize(group[0]) <= 2 * PARTIAL_HASH_BLOCK:
+                small.append(group)
+            else:
+                large.append(group)
+        return small + _split_by_hash(large, _full_hash, executor)
+
+
+def deduplicate(planned, action="quarantine", name_index=None, workers=DEFAULT_WORKERS):
+    """
+    Rewrite a plan so only the first copy of each duplicated file is moved.
+
+    With action="link" the other copies are replaced by hard links to the
+    moved copy at their planned target. With action="quarantine" they are
+    moved into a QUARANTINE_FOLDER next to their source instead of being
+    sorted.
+    """
+    if action not in ("link", "quarantine"):
+        raise ValueError(f"Unknown duplicate action: {action}")
+    if name_index is None:
+        name_index = NameIndex()
+
+    by_source = {move.source: move for move in planned}
+    replaced = {}
+    for group in find_duplicates(list(by_source), workers):
+        keeper = by_source[group[0]]
+        for path in group[1:]:
+            move = by_source[path]
+            if action == "link":
+                replaced[path] = move._replace(action="link", original=keeper.target)
+            else:
+                quarantine_dir = os.path.join(os.path.dirname(path), QUARANTINE_FOLDER)
+                target = name_index.claim(quarantine_dir, os.path.basename(path))
+                replaced[path] = Move(path, target, "quarantine", keeper.target)
+
+    return [replaced.get(move.source, move) for move in planned]
+
+
+def _apply_move(move):
+    if move.action == "link":
+        try:
+            os.link(move.original, move.target)
+        except OSError:
+            # No hard links here (other filesystem, FAT, ...): keep the copy
+            shutil.move(move.source, move.target)
+        else:
+            os.remove(move.source)
+    else:
+        shutil.move(move.source, move.target)
+
+
+class MoveJournal:
+    """
+    Append-only record of one organization run.
+
+    The whole plan is written when the run starts, then one line per finished
+    batch, flushed and fsynced once per batch rather than once per file. A run
+    that was interrupted can be resumed from the batches it did not finish, or
+    undone in bulk, without scanning the directories again.
+    """
+
+    def __init__(self, path, planned, batch_size=DEFAULT_BATCH_SIZE, completed=(),
+                 finished=False, undone=False, resumed=False):
+        self.path = path
+        self.planned = planned
+        self.batch_size = batch_size
+        self.completed = set(completed)
+        self.finished = finished
+        self.undone = undone
+        self.resumed = resumed
+        self._file = None
+
+    @classmethod
+    def create(cls, path, planned, batch_size=DEFAULT_BATCH_SIZE):
+        """Start a new journal at path for planned, replacing any older one."""
+        with open(path, "w") as f:
+            f.write(json.dumps({"type": "run", "batch_size": batch_size, "total": len(planned)}) + "\n")
+            for move in planned:
+                f.write(json.dumps({"type": "move", **move._asdict()}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return cls(path, planned, batch_size)
+
+    @classmethod
+    def load(cls, path):
+        """Read a journal back, skipping a line torn by a crash."""
+        planned = []
+        completed = set()
+        batch_size = DEFAULT_BATCH_SIZE
+        finished = undone = False
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                kind = record.pop("type", None)
+                if kind == "run":
+                    batch_size = record["batch_size"]
+                elif kind == "move":
+                    planned.append(Move(**record))
+                elif kind == "batch":
+                    completed.add(record["index"])
+                elif kind == "finished":
+                    finished = True
+                elif kind == "undone":
+                    undone = True
+        return cls(path, planned, batch_size, completed, finished, undone, resumed=True)
+
+    @property
+    def pending(self):
+        """True if the run was interrupted before all of its batches finished."""
+        return bool(self.planned) and not self.finished and not self.undone
+
+    def is_within(self, folder):
+        """True if every file the run planned to move came from under folder."""
+        folder = os.path.abspath(folder)
+        try:
+            return all(os.path.commonpath([folder, os.path.abspath(move.source)]) == folder
+                       for move in self.planned)
+        except ValueError:  # On another drive
+            return False
+
+    def _append(self, record):
+        if self._file is None:
+            self._file = open(self.path, "a+")
+            # Start on a fresh line if the previous writer died mid-record
+            if self._file.tell() > 0:
+                self._file.seek(self._file.tell() - 1)
+                if self._file.read(1) != "\n":
+                    self._file.write("\n")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record_batch(self, index):
+        self.completed.add(index)
+        self._append({"type": "batch", "index": index})
+
+    def record_finished(self):
+        self.finished = True
+        self._append({"type": "finished"})
+
+    def record_undone(self):
+        self.undone = True
+        self._append({"type": "undone"})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _numbered_batches(planned, batch_size):
+    """
+    Split a plan into (index, batch) pairs, grouped by phase.
+
+    Plain moves come first so that links and quarantined duplicates only run
+    once their originals are in place. The numbering is stable for a given
+    plan and batch size, which is what the journal relies on.
+    """
+    moves = [move for move in planned if move.action == "move"]
+    duplicates = [move for move in planned if move.action != "move"]
+
+    phases = []
+    index = 0
+    for phase in (moves, duplicates):
+        batches = []
+        for i in range(0, len(phase), batch_size):
+            batches.append((index, phase[i:i + batch_size]))
+            index += 1
+        phases.append(batches)
+    return phases
+
+
+def _already_moved(move):
+    return not os.path.lexists(move.source) and os.path.lexists(move.target)
+
+
+def _move_batch(batch, is_cancelled, skip_done=False):
+    moved = 0
+    for move in batch:
+        if is_cancelled():
+            break
+        # A resumed batch may have been cut short after some of its moves
+        if not (skip_done and _already_moved(move)):
+            _apply_move(move)
+        moved += 1
+    return moved
+
+
+def execute_moves(planned, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                  progress=None, progress_interval=0.1, is_cancelled=None, journal=None):
+    """
+    Perform a plan produced by plan_moves or deduplicate.
+
+    Moves run in batches on a thread pool; links and quarantined duplicates
+    follow once every original is in place. progress(done, total) is called
+    at most once per progress_interval seconds, plus once at the end.
+    is_cancelled() is polled between files. If a journal is given, each
+    finished batch is recorded in it and batches it already lists as done are
+    skipped. Returns the number of files handled.
+    """
+    if journal is not None:
+        planned = journal.planned
+        batch_size = journal.batch_size
+
+    total = len(planned)
+    if total == 0:
+        return 0
+
+    cancelled = False
+
+    def stopped():
+        return cancelled or (is_cancelled is not None and is_cancelled())
+
+    completed = journal.completed if journal is not None else set()
+    skip_done = journal is not None and journal.resumed
+
+    # Create every target folder once, before any file is moved
+    for target_dir in {os.path.dirname(move.target) for move in planned}:
+        os.makedirs(target_dir, exist_ok=True)
+
+    moved = 0
+    last_update = 0.0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for phase in _numbered_batches(planned, batch_size):
+            futures = {}
+            for index, batch in phase:
+                if index in completed:
+                    moved += len(batch)
+                else:
+                    future = executor.submit(_move_batch, batch, stopped, skip_done)
+                    futures[future] = (index, len(batch))
+            try:
+                for future in as_completed(futures):
+                    count = future.result()
+                    moved += count
+
+                    index, size = futures[future]
+                    if journal is not None and count == size:
+                        journal.record_batch(index)
+
+                    now = time.monotonic()
+                    if progress and now - last_update >= progress_interval:
+                        last_update = now
+                        progress(moved, total)
+            except Exception:
+                # Stop the remaining batches before reporting the error
+                cancelled = True
+                for future in futures:
+                    future.cancel()
+                raise
+
+            if stopped():
+                break
+
+    if journal is not None and moved == total:
+        journal.record_finished()
+
+    if progress:
+        progress(moved, total)
+    return moved
+
+
+def undo_run(journal, workers=DEFAULT_WORKERS, progress=None, is_cancelled=None):
+    """
+    Move every file the journaled run touched back where it came from.
+
+    Hard-linked duplicates are restored as links to the kept copy, which has
+    the same content. Returns the number of files restored.
+    """
+    restore = [Move(move.target, move.source) for move in reversed(journal.planned)
+               if _already_moved(move)]
+
+    restored = execute_moves(restore, workers=workers, progress=progress,
+                             is_cancelled=is_cancelled)
+    if restored == len(restore):
+        journal.record_undone()
+    return restored
+
+
+class _InotifyWatch:
+    """Linux inotify on a single directory, through ctypes so no package is needed."""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if self._libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def read(self, timeout):
+        """
+        Wait up to timeout seconds and return [(name, complete)] for changed files.
+
+        complete is True when the writer has closed the file or it was renamed
+        into place. Returns None if the kernel queue overflowed.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if name and not mask & self.IN_ISDIR:
+                events.append((name, bool(mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO))))
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingWatch:
+    """Fallback for platforms without inotify: list the directory every poll."""
+
+    def __init__(self, directory, interval=1.0):
+        self._directory = directory
+        self._interval = interval
+        self._known = self._list()
+
+    def _list(self):
+        with os.scandir(self._directory) as entries:
+            return {entry.name for entry in entries}
+
+    def read(self, timeout):
+        time.sleep(min(timeout, self._interval))
+        names = self._list()
+        new_names = names - self._known
+        self._known = names
+        return [(name, False) for name in new_names]
+
+    def close(self):
+        pass
+
+
+def open_watch(directory):
+    """Watch directory with inotify where available, else by polling."""
+    if sys.platform.startswith("linux"):
+        try:
+            return _InotifyWatch(directory)
+        except (OSError, AttributeError):
+            pass
+    return _PollingWatch(directory)
+
+
+class FolderWatcher:
+    """
+    Keep a directory organized by moving files as they arrive.
+
+    Only files reported by the filesystem watch are looked at, so the cost of
+    staying up to date grows with the number of new files, not with the size
+    of the directory. A file is moved once it has been quiet for settle
+    seconds: straight away if the writer closed it, otherwise once its size
+    and modification time stop changing.
+    """
+
+    def __init__(self, source_dir, mappings, settle=2.0, on_move=None):
+        self.source_dir = source_dir
+        self.settle = settle
+        self.on_move = on_move
+        self._extension_map = build_extension_map(mappings)
+        self._name_index = NameIndex()
+        self._pending = {}
+
+    def _note(self, name, complete, now):
+        if self._extension_map.get(os.path.splitext(name)[1].lower()):
+            self._pending[name] = (now, complete, None)
+
+    def _rescan(self, now):
+        # The kernel dropped events, so fall back to one full listing
+        with os.scandir(self.source_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self._note(entry.name, False, now)
+
+    def _ready_files(self, now):
+        ready = []
+        for name, (last_event, complete, signature) in list(self._pending.items()):
+            if now - last_event < self.settle:
+                continue
+            try:
+                st = os.stat(os.path.join(self.source_dir, name))
+            except FileNotFoundError:
+                del self._pending[name]
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                del self._pending[name]
+                continue
+
+            current = (st.st_size, st.st_mtime_ns)
+            if complete or current == signature:
+                del self._pending[name]
+                ready.append(name)
+            else:
+                self._pending[name] = (now, False, current)
+        return ready
+
+    def _move(self, name):
+        folder = self._extension_map[os.path.splitext(name)[1].lower()]
+        target_dir = os.path.join(self.source_dir, folder)
+        os.makedirs(target_dir, exist_ok=True)
+
+        # Something other than us may have written to the target folder
+        target_path = self._name_index.claim(target_dir, name)
+        while os.path.lexists(target_path):
+            target_path = self._name_index.claim(target_dir, name)
+
+        move = Move(os.path.join(self.source_dir, name), target_path)
+        _apply_move(move)
+        if self.on_move:
+            self.on_move(move)
+
+    def run(self, stop_event, poll_timeout=0.5):
+        """Watch until stop_event (a threading.Event) is set."""
+        watch = open_watch(self.source_dir)
+        try:
+            while not stop_event.is_set():
+                timeout = poll_timeout if not self._pending else min(poll_timeout, self.settle)
+                events = watch.read(timeout)
+                now = time.monotonic()
+                if events is None:
+                    self._rescan(now)
+                else:
+                    for name, complete in events:
+                        self._note(name, complete, now)
+
+                for name in self._ready_files(now):
+                    try:
+                        self._move(name)
+                    except OSError as e:
+                        print(f"Could not move {name}: {e}", file=sys.stderr)
+        finally:
+            watch.close()
+
+
+def write_plan(planned, output, fmt="json"):
+    """Write a plan to an open text file as JSON or CSV."""
+    if fmt == "csv":
+        writer = csv.writer(output)
+        writer.writerow(Move._fields)
+        writer.writerows(planned)
+    else:
+        json.dump([move._asdict() for move in planned], output, indent=2)
+        output.write("\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sort files into folders by extension.")
+    parser.add_argument("sources", nargs="*", help="directories to organize")
+    parser.add_argument("--config", default=CONFIG_FILE,
+                        help="mappings file (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only print the plan, do not move anything")
+    parser.add_argument("--plan", metavar="PATH",
+                        help="write the move plan to PATH ('-' for stdout)")
+    parser.add_argument("--format", choices=["json", "csv"],
+                        help="plan format (default: from the --plan extension, else json)")
+    parser.add_argument("--duplicates", choices=["link", "quarantine"],
+                        help="detect identical files and hard-link or quarantine the extra copies")
+    parser.add_argument("--journal", metavar="PATH",
+                        help="record the run in PATH so it can be resumed or undone")
+    parser.add_argument("--resume", metavar="PATH",
+                        help="finish the interrupted run recorded in journal PATH")
+    parser.add_argument("--undo", metavar="PATH",
+                        help="undo the run recorded in journal PATH")
+    parser.add_argument("--watch", action="store_true",
+                        help="after organizing, keep watching the sources for new files")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="seconds a new file must be quiet before it is moved (default: %(default)s)")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS,
+                        help="parallel move workers (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if not (args.sources or args.resume or args.undo):
+        parser.error("give at least one source directory, --resume or --undo")
+    if args.watch and (args.dry_run or not args.sources):
+        parser.error("--watch needs source directories and cannot be combined with --dry-run")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.resume or args.undo:
+        journal = MoveJournal.load(args.resume or args.undo)
+        try:
+            if args.undo:
+                if journal.undone:
+                    print("That run has already been undone", file=sys.stderr)
+                    return 1
+                restored = undo_run(journal, workers=args.workers)
+                print(f"Restored {restored} files", file=sys.stderr)
+            else:
+                moved = execute_moves(journal.planned, workers=args.workers, journal=journal)
+                print(f"Organized {moved} files", file=sys.stderr)
+        finally:
+            journal.close()
+        return 0
+
+    mappings = load_mappings(args.config)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.plan and args.plan.lower().endswith(".csv") else "json"
+
+    name_index = NameIndex()
+    planned = []
+    for source in args.sources:
+        if not os.path.isdir(source):
+            print(f"Skipping {source}: not a directory", file=sys.stderr)
+            continue
+        planned.extend(plan_moves(os.path.abspath(source), mappings, name_index))
+
+    if args.duplicates:
+        planned = deduplicate(planned, args.duplicates, name_index, args.workers)
+
+    if args.plan == "-" or (args.dry_run and not args.plan):
+        write_plan(planned, sys.stdout, fmt)
+    elif args.plan:
+        with open(args.plan, "w", newline="" if fmt == "csv" else None) as f:
+            write_plan(planned, f, fmt)
+
+    if args.dry_run:
+        print(f"Dry run: {len(planned)} files would be moved", file=sys.stderr)
+        return 0
+
+    journal = MoveJournal.create(args.journal, planned) if args.journal else None
+    try:
+        moved = execute_moves(planned, workers=args.workers, journal=journal)
+    finally:
+        if journal is not None:
+            journal.close()
+    print(f"Organized {moved} files", file=sys.stderr)
+
+    if args.watch:
+        watch_forever(args.sources, mappings, args.settle)
+    return 0
+
+
+def watch_forever(sources, mappings, settle):
+    def report(move):
+        print(f"{move.source} -> {move.target}", file=sys.stderr)
+
+    stop_event = threading.Event()
+    threads = []
+    for source in sources:
+        if not os.path.isdir(source):
+            continue
+        watcher = FolderWatcher(os.path.abspath(source), mappings, settle, on_move=report)
+        thread = threading.Thread(target=watcher.run, args=(stop_event,), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    print(f"Watching {len(threads)} directories, press Ctrl+C to stop", file=sys.stderr)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
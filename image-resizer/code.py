@@ -1,13 +1,15 @@
 #image resizer
 
 import customtkinter as ctk
-from PIL import Image
-import os
 from pathlib import Path
 import threading
 from tkinter import filedialog, messagebox
 import tkinter.font as tkfont
 
+from resize_engine import PRESET_GROUPS, ResizeManifest, list_images, preset_jobs, run_jobs, single_size_jobs
+
+CUSTOM_SIZE = "Custom size"
+
 class ImageResizerApp:
     def __init__(self):
         self.window = ctk.CTk()
@@ -29,6 +31,7 @@ class ImageResizerApp:
         self.source_folder = ""
         self.output_folder = ""
         self.is_processing = False
+        self.skipped_count = 0
     
     def setup_ui(self):
         # Header
@@ -70,6 +73,17 @@ class ImageResizerApp:
         resize_frame = ctk.CTkFrame(self.window)
         resize_frame.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
         
+        # Preset selection
+        ctk.CTkLabel(resize_frame, text="Preset:", font=self.default_font).pack(side="left", padx=5)
+        self.preset_var = ctk.StringVar(value=CUSTOM_SIZE)
+        self.preset_menu = ctk.CTkOptionMenu(
+            resize_frame,
+            values=[CUSTOM_SIZE] + list(PRESET_GROUPS),
+            variable=self.preset_var,
+            font=self.default_font
+        )
+        self.preset_menu.pack(side="left", padx=5)
+        
         # Width input
         ctk.CTkLabel(resize_frame, text="Width:", font=self.default_font).pack(side="left", padx=5)
         self.width_var = ctk.StringVar(value="1920")
@@ -92,6 +106,26 @@ class ImageResizerApp:
         )
         self.aspect_ratio_cb.pack(side="left", padx=20)
         
+        # Fast downscale checkbox
+        self.fast_downscale_var = ctk.BooleanVar(value=True)
+        self.fast_downscale_cb = ctk.CTkCheckBox(
+            resize_frame,
+            text="Fast downscale",
+            variable=self.fast_downscale_var,
+            font=self.default_font
+        )
+        self.fast_downscale_cb.pack(side="left", padx=5)
+        
+        # Skip unchanged checkbox
+        self.skip_unchanged_var = ctk.BooleanVar(value=True)
+        self.skip_unchanged_cb = ctk.CTkCheckBox(
+            resize_frame,
+            text="Skip unchanged",
+            variable=self.skip_unchanged_var,
+            font=self.default_font
+        )
+        self.skip_unchanged_cb.pack(side="left", padx=5)
+        
         # Progress frame
         progress_frame = ctk.CTkFrame(self.window)
         progress_frame.grid(row=3, column=0, padx=20, pady=10, sticky="nsew")
@@ -129,43 +163,44 @@ class ImageResizerApp:
     
     def resize_images(self):
         try:
-            width = int(self.width_var.get())
-            height = int(self.height_var.get())
-            
-            if width <= 0 or height <= 0:
-                raise ValueError("Width and height must be positive numbers")
+            preset = self.preset_var.get()
+            if preset == CUSTOM_SIZE:
+                width = int(self.width_var.get())
+                height = int(self.height_var.get())
+                
+                if width <= 0 or height <= 0:
+                    raise ValueError("Width and height must be positive numbers")
             
-            image_files = [f for f in os.listdir(self.source_folder)
-                          if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
+            image_files = list_images(self.source_folder)
             
             if not image_files:
-                messagebox.showwarning("No Images", "No supported image files found in the source folder")
+                self.window.after(0, self.no_images_found)
                 return
             
-            self.progress_bar.set(0)
-            total_files = len(image_files)
+            self.window.after(0, self.progress_bar.set, 0)
+            keep_aspect = self.aspect_ratio_var.get()
+            fast = self.fast_downscale_var.get()
+            if preset == CUSTOM_SIZE:
+                jobs = single_size_jobs(self.source_folder, self.output_folder, image_files,
+                                        width, height, keep_aspect, fast)
+            else:
+                # Every size in the group is made from one decode of each image
+                jobs = preset_jobs(self.source_folder, self.output_folder, image_files,
+                                   PRESET_GROUPS[preset], keep_aspect, fast)
             
-            for i, filename in enumerate(image_files, 1):
-                if not self.is_processing:
-                    break
-                
-                input_path = os.path.join(self.source_folder, filename)
-                output_path = os.path.join(self.output_folder, filename)
-                
-                with Image.open(input_path) as img:
-                    if self.aspect_ratio_var.get():
-                        # Calculate new dimensions maintaining aspect ratio
-                        ratio = min(width/img.width, height/img.height)
-                        new_width = int(img.width * ratio)
-                        new_height = int(img.height * ratio)
-                    else:
-                        new_width, new_height = width, height
-                    
-                    resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    resized.save(output_path, quality=95, optimize=True)
-                
-                progress = i / total_files
-                self.window.after(0, self.update_progress, progress, f"Processing: {i}/{total_files}")
+            # Leave out images whose outputs from a previous run are still current
+            manifest = ResizeManifest(self.output_folder) if self.skip_unchanged_var.get() else None
+            self.skipped_count = 0
+            if manifest is not None:
+                jobs, unchanged = manifest.plan(jobs)
+                self.skipped_count = len(unchanged)
+            
+            try:
+                run_jobs(jobs, progress=self.report_progress, is_cancelled=lambda: not self.is_processing,
+                         on_result=manifest.record if manifest is not None else None)
+            finally:
+                if manifest is not None:
+                    manifest.save()
             
             if self.is_processing:
                 self.window.after(0, self.processing_complete)
@@ -173,6 +208,17 @@ class ImageResizerApp:
         except Exception as e:
             self.window.after(0, self.processing_error, str(e))
     
+    def report_progress(self, done, total):
+        done += self.skipped_count
+        total += self.skipped_count
+        self.window.after(0, self.update_progress, done / total, f"Processing: {done}/{total}")
+    
+    def no_images_found(self):
+        self.is_processing = False
+        self.process_button.configure(text="Start Processing", command=self.start_processing)
+        self.status_label.configure(text="Ready")
+        messagebox.showwarning("No Images", "No supported image files found in the source folder")
+    
     def start_processing(self):
         if not self.source_folder or not self.output_folder:
             messagebox.showwarning("Missing Folders", "Please select both source and output folders")
@@ -200,7 +246,10 @@ class ImageResizerApp:
     def processing_complete(self):
         self.is_processing = False
         self.process_button.configure(text="Start Processing", command=self.start_processing)
-        self.status_label.configure(text="Processing complete!")
+        if self.skipped_count:
+            self.status_label.configure(text=f"Processing complete! ({self.skipped_count} unchanged images skipped)")
+        else:
+            self.status_label.configure(text="Processing complete!")
     
     def processing_error(self, error_message):
         self.is_processing = False
@@ -0,0 +1,304 @@
+"""
+Resizing engine for the Bulk Image Resizer.
+
+Images are decoded, resized and saved on a pool of worker processes so a large
+folder uses every core. Kept free of GUI imports so the workers start quickly.
+"""
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from PIL import Image
+
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+# With fast downscaling, shrink by integer factors until the image is within
+# this factor of the target size, then finish with LANCZOS
+REDUCING_GAP = 3.0
+
+# One file to write: where, how big, and in which format (None keeps the
+# format implied by the file extension) and quality
+OutputSpec = namedtuple("OutputSpec", ["path", "width", "height", "keep_aspect",
+                                       "format", "quality"], defaults=[None, 95])
+
+# One source image and every output made from it. fast enables the draft
+# decode and reduce-before-resample path. known_hash is the source's content
+# hash from the last run; if it still matches, the outputs are left alone.
+ResizeJob = namedtuple("ResizeJob", ["input_path", "outputs", "fast", "known_hash"],
+                       defaults=[False, None])
+
+# What resize_one reports back for the manifest
+ResizeResult = namedtuple("ResizeResult", ["size", "mtime_ns", "hash", "resized"])
+
+MANIFEST_NAME = ".resize_manifest.json"
+
+# One size within a preset group; files go to a sub-folder named after it
+OutputPreset = namedtuple("OutputPreset", ["name", "width", "height", "format", "quality"])
+
+PRESET_GROUPS = {
+    "Web (large, medium, thumb)": [
+        OutputPreset("large", 1920, 1080, "JPEG", 90),
+        OutputPreset("medium", 1024, 768, "JPEG", 85),
+        OutputPreset("thumb", 320, 240, "JPEG", 80),
+    ],
+    "WebP (large, medium, thumb)": [
+        OutputPreset("large", 1920, 1080, "WEBP", 85),
+        OutputPreset("medium", 1024, 768, "WEBP", 80),
+        OutputPreset("thumb", 320, 240, "WEBP", 75),
+    ],
+    "Social (post, story, avatar)": [
+        OutputPreset("post", 1080, 1080, "JPEG", 90),
+        OutputPreset("story", 1080, 1920, "JPEG", 90),
+        OutputPreset("avatar", 400, 400, "PNG", 95),
+    ],
+}
+
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+
+_cancel_event = None
+
+
+def list_images(folder):
+    return [f for f in os.listdir(folder) if f.lower().endswith(SUPPORTED_EXTENSIONS)]
+
+
+def single_size_jobs(source_folder, output_folder, filenames, width, height, keep_aspect, fast=False):
+    """One output per image, same name and format as the source."""
+    return [ResizeJob(os.path.join(source_folder, filename),
+                      [OutputSpec(os.path.join(output_folder, filename), width, height, keep_aspect)],
+                      fast)
+            for filename in filenames]
+
+
+def preset_jobs(source_folder, output_folder, filenames, presets, keep_aspect, fast=False):
+    """
+    One output per preset for each image, under output_folder/<preset name>/.
+
+    Outputs are named after the source without its extension. When two
+    sources share a name (photo.jpg, photo.png), both keep their extension in
+    it instead (photo_jpg.webp, photo_png.webp) so neither overwrites the other.
+    """
+    stem_counts = Counter(os.path.splitext(filename)[0].lower() for filename in filenames)
+    jobs = []
+    for filename in filenames:
+        stem, extension = os.path.splitext(filename)
+        if stem_counts[stem.lower()] > 1:
+            stem = f"{stem}_{extension.lstrip('.')}"
+        outputs = [OutputSpec(os.path.join(output_folder, preset.name,
+                                           stem + FORMAT_EXTENSIONS[preset.format]),
+                              preset.width, preset.height, keep_aspect,
+                              preset.format, preset.quality)
+                   for preset in presets]
+        jobs.append(ResizeJob(os.path.join(source_folder, filename), outputs, fast))
+    return jobs
+
+
+def target_size(image_size, width, height, keep_aspect):
+    if not keep_aspect:
+        return width, height
+    # Calculate new dimensions maintaining aspect ratio
+    ratio = min(width / image_size[0], height / image_size[1])
+    return int(image_size[0] * ratio), int(image_size[1] * ratio)
+
+
+def _init_worker(cancel_event):
+    """Runs once in each worker process."""
+    global _cancel_event
+    _cancel_event = cancel_event
+    # Register every format plugin now instead of on the first open
+    Image.init()
+
+
+def resize_one(job):
+    """
+    Make every output of a job from a single decode of its source.
+
+    Outputs are produced largest first, each resampled from the previous one
+    when that is still big enough (large -> medium -> thumb), so the full
+    size image is only resampled once. The source is read into memory once
+    and hashed on the way. Returns a ResizeResult, or None if the run was
+    cancelled first.
+    """
+    if _cancel_event is not None and _cancel_event.is_set():
+        return None
+
+    with open(job.input_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        data = f.read()
+    digest = hashlib.blake2b(data).hexdigest()
+    if digest == job.known_hash:
+        # Touched but not changed: the outputs from last time still hold
+        return ResizeResult(st.st_size, st.st_mtime_ns, digest, False)
+
+    with Image.open(io.BytesIO(data)) as img:
+        # Only the header has been read so far, so the sizes are known for free
+        sized = [(target_size(img.size, output.width, output.height, output.keep_aspect), output)
+                 for output in job.outputs]
+        sized.sort(key=lambda item: item[0][0] * item[0][1], reverse=True)
+
+        if job.fast and img.format == "JPEG":
+            # Decode at the smallest DCT scale that still covers every output
+            img.draft(img.mode, (max(size[0] for size, _ in sized),
+                                 max(size[1] for size, _ in sized)))
+
+        reducing_gap = REDUCING_GAP if job.fast else None
+        previous = img
+        for new_size, output in sized:
+            source = previous
+            if source.size[0] < new_size[0] or source.size[1] < new_size[1]:
+                source = img
+            resized = source.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
+            save_output(resized, output)
+            previous = resized
+    return ResizeResult(st.st_size, st.st_mtime_ns, digest, True)
+
+
+def save_output(image, output):
+    if output.format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+
+    options = {"quality": output.quality, "optimize": True}
+    if output.format == "WEBP":
+        options["method"] = 4
+    image.save(output.path, format=output.format, **options)
+
+
+class ResizeManifest:
+    """
+    Record of what was made from each source, kept in the output folder.
+
+    An entry holds the source's size, mtime and content hash plus the resize
+    parameters. A source whose size, mtime and parameters all match, and
+    whose outputs are still there, is skipped without being opened. If only
+    its mtime changed, the worker hashes it and skips the resize when the
+    content is the same.
+    """
+
+    def __init__(self, output_folder):
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.entries = {}
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _key(job):
+        return os.path.basename(job.input_path)
+
+    @staticmethod
+    def _params(job):
+        return {"fast": job.fast,
+                "outputs": [[output.path, output.width, output.height, output.keep_aspect,
+                             output.format, output.quality] for output in job.outputs]}
+
+    def plan(self, jobs):
+        """Split jobs into (to_run, unchanged), adding known hashes to to_run."""
+        to_run = []
+        unchanged = []
+        for job in jobs:
+            entry = self.entries.get(self._key(job))
+            if entry is None or entry["params"] != self._params(job):
+                to_run.append(job)
+                continue
+
+            st = os.stat(job.input_path)
+            outputs_exist = all(os.path.exists(output.path) for output in job.outputs)
+            if not outputs_exist or entry["size"] != st.st_size:
+                # A missing output has to be remade whatever the hash says
+                to_run.append(job)
+            elif entry["mtime_ns"] == st.st_mtime_ns:
+                unchanged.append(job)
+            else:
+                to_run.append(job._replace(known_hash=entry["hash"]))
+        return to_run, unchanged
+
+    def record(self, job, result):
+        self.entries[self._key(job)] = {"size": result.size, "mtime_ns": result.mtime_ns,
+                                        "hash": result.hash, "params": self._params(job)}
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.path)
+
+
+def run_jobs(jobs, workers=None, progress=None, is_cancelled=None, max_updates_per_second=10,
+             on_result=None):
+    """
+    Process jobs on a pool of worker processes.
+
+    At most a few jobs per worker are queued at any time, so memory stays flat
+    however many files there are. is_cancelled() is polled as jobs finish and
+    stops the workers before their next image. progress(done, total) is called
+    at most max_updates_per_second times, plus once at the end.
+    on_result(job, result) is called in this process for every finished job.
+    The first failure cancels the run and is raised. Returns the number of
+    images done.
+    """
+    workers = workers or os.cpu_count() or 1
+    total = len(jobs)
+    if total == 0:
+        return 0
+
+    # Create every output folder once, before any image is written
+    for folder in {os.path.dirname(output.path) for job in jobs for output in job.outputs}:
+        os.makedirs(folder, exist_ok=True)
+
+    # The GUI calls this from a worker thread, and forking a threaded Tk
+    # process is unsafe, so workers are started fresh
+    context = multiprocessing.get_context("spawn")
+    cancel_event = context.Event()
+    min_interval = 1.0 / max_updates_per_second
+    last_update = 0.0
+    done = 0
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(cancel_event,)) as executor:
+        pending = {}
+        queued = iter(jobs)
+        exhausted = False
+        try:
+            while pending or not exhausted:
+                # Keep the work queue topped up, but bounded
+                while not exhausted and len(pending) < workers * 2:
+                    job = next(queued, None)
+                    if job is None:
+                        exhausted = True
+                    else:
+                        pending[executor.submit(resize_one, job)] = job
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = pending.pop(future)
+                    result = future.result()
+                    if result is not None:
+                        done += 1
+                        if on_result:
+                            on_result(job, result)
+
+                if is_cancelled is not None and is_cancelled():
+                    cancel_event.set()
+                    exhausted = True
+
+                now = time.monotonic()
+                if progress and now - last_update >= min_interval:
+                    last_update = now
+                    progress(done, total)
+        except Exception:
+            cancel_event.set()
+            for future in pending:
+                future.cancel()
+            raise
+
+    if progress:
+        progress(done, total)
+    return done
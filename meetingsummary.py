@@ -242,15 +242,279 @@ if __name__ == "__main__":
     main()
 
 # Section 2: Audio Processing
-class AudioProcessor:
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# A slice of 16-bit mono PCM audio; start is in seconds from the beginning
+PcmChunk = namedtuple("PcmChunk", ["index", "start", "data", "sample_rate", "sample_width"])
+
+def stream_pcm_chunks(audio_file, chunk_seconds=30, sample_rate=16000):
+    """
+    Decode an audio file into fixed-size PCM chunks, one chunk at a time
+    
+    ffmpeg decodes and resamples any format to 16-bit mono on a pipe, so only
+    the chunk being read is held in memory and nothing is written to disk.
+    Without ffmpeg, WAV files are read directly at their own sample rate and
+    converted to 16-bit mono.
+    
+    Args:
+        audio_file (str): Path to the audio file
+        chunk_seconds (float): Length of each chunk
+        sample_rate (int): Sample rate to decode to (ffmpeg only)
+        
+    Yields:
+        PcmChunk: The next chunk of audio
+    """
+    import shutil
+    import subprocess
+    
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        yield from _stream_wav_chunks(audio_file, chunk_seconds)
+        return
+    
+    chunk_bytes = int(chunk_seconds * sample_rate) * 2
+    command = [ffmpeg, "-nostdin", "-v", "error", "-i", audio_file,
+               "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-"]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        index = 0
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield PcmChunk(index, index * chunk_seconds, data, sample_rate, 2)
+            index += 1
+    except BaseException:
+        # Stopped early (or failed): do not wait for ffmpeg to finish decoding
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        error = process.stderr.read().decode(errors="replace").strip()
+        process.stderr.close()
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode {audio_file}: {error}")
+
+def _to_16bit_mono(data, sample_width, channels):
+    """Convert little-endian WAV frames of any sample width to 16-bit mono"""
+    import numpy as np
+    
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if sample_width == 1:
+        # 8-bit WAV samples are unsigned
+        samples = (raw.astype(np.int16) - 128) << 8
+    else:
+        # Keep the two most significant bytes of each sample
+        raw = raw[:len(raw) // sample_width * sample_width].reshape(-1, sample_width)
+        samples = np.ascontiguousarray(raw[:, -2:]).view("<i2").reshape(-1)
+    if channels > 1:
+        samples = samples[:len(samples) // channels * channels].reshape(-1, channels)
+        samples = samples.mean(axis=1).astype(np.int16)
+    return samples.astype("<i2").tobytes()
+
+def _stream_wav_chunks(audio_file, chunk_seconds):
+    import wave
+    
+    with wave.open(audio_file, "rb") as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        sample_rate = wav.getframerate()
+        frames_per_chunk = int(chunk_seconds * sample_rate)
+        index = 0
+        while True:
+            data = wav.readframes(frames_per_chunk)
+            if not data:
+                break
+            if sample_width != 2 or channels > 1:
+                data = _to_16bit_mono(data, sample_width, channels)
+            yield PcmChunk(index, index * chunk_seconds, data, sample_rate, 2)
+            index += 1
+
+def segment_speech(chunks, frame_ms=30, threshold_rms=300, hangover_ms=300,
+                   min_seconds=2, max_seconds=30):
+    """
+    Re-cut a PCM stream into speech segments, ending them in pauses
+    
+    Every frame_ms frame counts as speech if its RMS reaches threshold_rms. A
+    segment ends once hangover_ms of quiet follows it and it is at least
+    min_seconds long; shorter segments carry on into the next speech, with
+    the pause between them trimmed to the hangover. Segments that reach
+    max_seconds are cut at their quietest frame in the second half, so words
+    are not split. Silence outside segments is dropped.
+    
+    Args:
+        chunks: Iterable of 16-bit PcmChunk, in order, of any length
+        
+    Yields:
+        PcmChunk: Speech segments, numbered from 0, with their real start times
+    """
+    import numpy as np
+    
+    sample_rate = None
+    frame_length = hangover_frames = min_frames = max_frames = 0
+    carry = np.empty(0, dtype=np.int16)
+    position = 0  # Samples consumed so far
+    frames = []   # Frames of the open segment
+    levels = []   # Their RMS
+    starts = []   # And where each one starts, in samples
+    quiet_run = 0
+    index = 0
+    
+    def emit(count):
+        nonlocal frames, levels, starts, index
+        data = np.concatenate(frames[:count]).tobytes()
+        segment = PcmChunk(index, starts[0] / sample_rate, data, sample_rate, 2)
+        index += 1
+        frames, levels, starts = frames[count:], levels[count:], starts[count:]
+        return segment
+    
+    for chunk in chunks:
+        if chunk.sample_width != 2:
+            raise ValueError("Speech segmentation needs 16-bit audio")
+        if sample_rate is None:
+            sample_rate = chunk.sample_rate
+            frame_length = max(1, sample_rate * frame_ms // 1000)
+            hangover_frames = max(1, hangover_ms // frame_ms)
+            min_frames = int(min_seconds * 1000 // frame_ms)
+            max_frames = max(min_frames + 1, int(max_seconds * 1000 // frame_ms))
+        
+        samples = np.concatenate([carry, np.frombuffer(chunk.data, dtype=np.int16)])
+        usable = len(samples) - len(samples) % frame_length
+        carry = samples[usable:]
+        block = samples[:usable].reshape(-1, frame_length)
+        # RMS of every frame in the block at once
+        block_levels = np.sqrt(np.mean(block.astype(np.float64) ** 2, axis=1))
+        
+        for frame, level in zip(block, block_levels):
+            if level >= threshold_rms:
+                quiet_run = 0
+            elif frames:
+                quiet_run += 1
+            
+            if level >= threshold_rms or (frames and quiet_run <= hangover_frames):
+                frames.append(frame)
+                levels.append(level)
+                starts.append(position)
+            position += frame_length
+            
+            if frames and quiet_run == hangover_frames and len(frames) >= min_frames:
+                yield emit(len(frames))
+            elif len(frames) >= max_frames:
+                search_from = max(min_frames, max_frames // 2)
+                cut = search_from + int(np.argmin(levels[search_from:]))
+                yield emit(cut + 1)
+    
+    if any(level >= threshold_rms for level in levels):
+        yield emit(len(frames))
+
+class GoogleRecognizer:
+    """Google Web Speech API, as used by speech_recognition's recognize_google"""
     def __init__(self):
-        """Initialize the audio processor with speech recognition capabilities"""
-        # Import here to avoid loading these libraries until needed
         import speech_recognition as sr
-        import librosa
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        
+    def recognize(self, chunk):
+        audio_data = self.sr.AudioData(chunk.data, chunk.sample_rate, chunk.sample_width)
+        try:
+            return self.recognizer.recognize_google(audio_data)
+        except self.sr.UnknownValueError:
+            return "[inaudible]"
+
+class SphinxRecognizer(GoogleRecognizer):
+    """CMU Sphinx, fully offline; needs the pocketsphinx package"""
+    def recognize(self, chunk):
+        audio_data = self.sr.AudioData(chunk.data, chunk.sample_rate, chunk.sample_width)
+        try:
+            return self.recognizer.recognize_sphinx(audio_data)
+        except self.sr.UnknownValueError:
+            return "[inaudible]"
+
+class StandInRecognizer:
+    """
+    Local stand-in that needs no models or network, for tests and dry runs
+    
+    Silent chunks give no text; any other chunk gives a marker with its
+    position, so the order of the reassembled transcript can be checked.
+    """
+    def __init__(self, silence_rms=100):
+        self.silence_rms = silence_rms
+        
+    def recognize(self, chunk):
         import numpy as np
+        samples = np.frombuffer(chunk.data, dtype=np.int16).astype(np.float64)
+        if len(samples) == 0 or np.sqrt(np.mean(samples ** 2)) < self.silence_rms:
+            return ""
+        return f"[speech at {chunk.start:g}s]"
+
+RECOGNIZER_BACKENDS = {
+    "google": GoogleRecognizer,
+    "sphinx": SphinxRecognizer,
+    "stand-in": StandInRecognizer,
+}
+
+def recognize_in_order(chunks, recognizer, workers=4, progress=None):
+    """
+    Recognize chunks concurrently and return their texts in chunk order
+    
+    At most two chunks per worker are decoded and waiting at any time, and a
+    finished chunk is only held until every chunk before it is done, so
+    memory stays flat however long the recording is. A chunk that fails is
+    transcribed as "[inaudible]".
+    
+    Args:
+        chunks: Iterable of PcmChunk, in order
+        recognizer: Object with a thread-safe recognize(chunk) method
+        workers (int): Chunks recognized at the same time
+        progress: Called with the number of chunks done, in order
+        
+    Returns:
+        list: The text of every chunk
+    """
+    texts = []
+    finished = {}
+    chunks = iter(chunks)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            # Keep the pool busy, but bounded
+            while not exhausted and len(pending) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending[executor.submit(recognizer.recognize, chunk)] = chunk.index
+            if not pending:
+                break
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    finished[index] = future.result()
+                except Exception:
+                    finished[index] = "[inaudible]"
+            
+            # Hand over everything that is now complete from the start
+            while len(texts) in finished:
+                texts.append(finished.pop(len(texts)))
+                if progress:
+                    progress(len(texts))
+    return texts
+
+class AudioProcessor:
+    def __init__(self, backend="google"):
+        """
+        Initialize the audio processor with speech recognition capabilities
         
-        self.recognizer = sr.Recognizer()
+        Args:
+            backend (str): Recognizer used for large files, a key of RECOGNIZER_BACKENDS
+        """
+        # Each backend imports its own libraries, so the stand-in needs none
+        self.backend = RECOGNIZER_BACKENDS[backend]()
         
     def transcribe(self, audio_file):
         """
@@ -262,86 +526,79 @@ class AudioProcessor:
         Returns:
             str: Transcribed text
         """
+        # Import here to avoid loading these libraries until needed
         import speech_recognition as sr
         
+        recognizer = sr.Recognizer()
+        
         # For very large files, we might want to split them
         # This is a simplified version
         try:
             # Load audio file
             with sr.AudioFile(audio_file) as source:
                 # Adjust for ambient noise
-                self.recognizer.adjust_for_ambient_noise(source)
+                recognizer.adjust_for_ambient_noise(source)
                 
                 # Record the audio
-                audio_data = self.recognizer.record(source)
+                audio_data = recognizer.record(source)
                 
                 # Use Google's speech recognition
                 # In a production app, you might want to use a paid API for better results
-                text = self.recognizer.recognize_google(audio_data)
+                text = recognizer.recognize_google(audio_data)
                 
                 return text
         except Exception as e:
             # In a real app, you'd handle different exceptions separately
             return f"Error transcribing audio: {str(e)}"
     
-    def transcribe_large_file(self, audio_file):
+    def transcribe_large_file(self, audio_file, chunk_seconds=30, workers=4, progress=None,
+                              segment=True):
         """
-        Handle large audio files by splitting them into chunks
+        Handle large audio files by streaming them through the recognizer in chunks
+        
+        The file is decoded a few seconds at a time and chunks are recognized
+        concurrently, so a long meeting neither has to fit in memory nor
+        wait for one chunk after another. With segment, chunks are cut in
+        pauses instead of every chunk_seconds, and silence is not sent to
+        the recognizer at all.
         
         Args:
             audio_file (str): Path to the audio file
+            chunk_seconds (float): Length of each chunk, or the longest segment
+            workers (int): Chunks recognized at the same time
+            progress: Called with the number of chunks transcribed so far
+            segment (bool): Cut on voice activity rather than fixed lengths
             
         Returns:
             str: Transcribed text
         """
-        import speech_recognition as sr
-        import librosa
-        import numpy as np
-        from pydub import AudioSegment
-        import tempfile
-        
-        # For demonstration purposes, this is a simplified implementation
         try:
-            # Convert to wav if needed
-            sound = AudioSegment.from_file(audio_file)
-            
-            # Split audio into 30-second chunks
-            chunk_length_ms = 30000  # 30 seconds
-            chunks = [sound[i:i+chunk_length_ms] for i in range(0, len(sound), chunk_length_ms)]
-            
-            transcript = ""
-            
-            # Process each chunk
-            for i, chunk in enumerate(chunks):
-                # Export chunk to a temporary file
-                with tempfile.NamedTemporaryFile(suffix=".wav") as temp_file:
-                    chunk.export(temp_file.name, format="wav")
-                    
-                    with sr.AudioFile(temp_file.name) as source:
-                        audio_data = self.recognizer.record(source)
-                        try:
-                            text = self.recognizer.recognize_google(audio_data)
-                            transcript += text + " "
-                        except:
-                            transcript += "[inaudible] "
-            
-            return transcript
+            if segment:
+                chunks = segment_speech(stream_pcm_chunks(audio_file, 5), max_seconds=chunk_seconds)
+            else:
+                chunks = stream_pcm_chunks(audio_file, chunk_seconds)
+            texts = recognize_in_order(chunks, self.backend, workers, progress)
+            return " ".join(text for text in texts if text)
         except Exception as e:
             return f"Error processing large audio file: {str(e)}"
 
 # Section 3: Summarization
+from summarization_models import get_summarizer, map_reduce_summarize
+
 class Summarizer:
-    def __init__(self):
-        """Initialize the summarizer with NLP models"""
-        # Import here to avoid loading these libraries until needed
+    def __init__(self, model="facebook/bart-large-cnn"):
+        """Initialize the summarizer; the model itself is loaded on first use"""
+        self.model = model
+        
+    @property
+    def summarizer(self):
+        # Shared with every other Summarizer in the process, and loaded only once
+        # The first time this runs it will download the model
         try:
-            from transformers import pipeline
-            # You would need to install transformers and torch
-            # The first time this runs it will download the model
-            self.summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+            return get_summarizer(self.model)
         except ImportError:
             # Fallback to a simpler summarizer if transformers is not available
-            self.summarizer = None
+            return None
     
     def generate_summary(self, text):
         """
@@ -357,28 +614,13 @@ class Summarizer:
             return "No transcript was provided to summarize."
         
         # If we have the transformers library and model
-        if self.summarizer:
+        summarizer = self.summarizer
+        if summarizer:
             try:
-                # For long texts, we need to chunk it
-                # BART has a max input length
-                if len(text) > 1024:
-                    chunks = self._split_into_chunks(text, 1024)
-                    summaries = []
-                    
-                    for chunk in chunks:
-                        summary = self.summarizer(chunk, max_length=150, min_length=30, do_sample=False)
-                        summaries.append(summary[0]['summary_text'])
-                    
-                    # Combine chunk summaries and summarize again for coherence
-                    final_text = " ".join(summaries)
-                    if len(final_text) > 1024:
-                        final_summary = self.summarizer(final_text[:1024], max_length=150, min_length=30, do_sample=False)
-                        return final_summary[0]['summary_text']
-                    else:
-                        return final_text
-                else:
-                    summary = self.summarizer(text, max_length=150, min_length=30, do_sample=False)
-                    return summary[0]['summary_text']
+                # BART has a max input length, so long texts are summarized in
+                # token-sized chunks (batched), then the summaries of those,
+                # until one summary is left
+                return map_reduce_summarize(summarizer, text, max_length=150, min_length=30)
             except Exception as e:
                 # Fallback to the simple summarizer
                 return self._simple_summarize(text) + f"\n\nNote: Advanced summarization failed with error: {str(e)}"
@@ -436,25 +678,4 @@ class Summarizer:
             if len(text) > 1000:
                 return text[:1000] + "... (Summary failed: " + str(e) + ")"
             else:
-                return text
-    
-    def _split_into_chunks(self, text, chunk_size):
-        """Split text into chunks of approximately equal size"""
-        sentences = sent_tokenize(text)
-        current_chunk = []
-        chunks = []
-        current_size = 0
-        
-        for sentence in sentences:
-            current_size += len(sentence)
-            if current_size > chunk_size:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = [sentence]
-                current_size = len(sentence)
-            else:
-                current_chunk.append(sentence)
-                
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-            
-        return chunks
\ No newline at end of file
+                return text
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+Frequency-based sentence scoring with spaCy, for txtsummarizer.py.
+
+Every document goes through the spaCy pipeline once. Lemma frequencies are
+counted over the whole document and each sentence is scored from its span of
+the same Doc, with numpy arrays instead of Python dicts. Components the
+scoring does not need are switched off: named entities always, and the
+dependency parser too when the model has a faster sentence recognizer.
+
+    from sentence_scoring import load_scoring_pipeline, score_documents
+    nlp = load_scoring_pipeline("en_core_web_sm")
+    for sentences, scores in score_documents(nlp, texts):
+        ...
+"""
+
+import numpy as np
+import spacy
+from spacy.attrs import IS_PUNCT, IS_SPACE, IS_STOP, LEMMA
+
+
+def load_scoring_pipeline(model="en_core_web_sm"):
+    """Load model with only the components sentence scoring uses."""
+    nlp = spacy.load(model, exclude=["ner"])
+    return configure_for_scoring(nlp)
+
+
+def configure_for_scoring(nlp):
+    """Disable what scoring does not need in an already loaded pipeline."""
+    if "ner" in nlp.pipe_names:
+        nlp.disable_pipe("ner")
+
+    # Sentence boundaries from the senter are much cheaper than a full parse
+    if "senter" in nlp.component_names and "parser" in nlp.pipe_names:
+        nlp.enable_pipe("senter")
+        nlp.disable_pipe("parser")
+    elif not any(name in nlp.pipe_names for name in ("parser", "senter", "sentencizer")):
+        nlp.add_pipe("sentencizer")
+    return nlp
+
+
+def score_doc(doc):
+    """
+    Return (sentences, scores) for a parsed Doc.
+
+    A sentence scores the summed document frequency of its lemmas, leaving
+    out stop words, punctuation and whitespace.
+    """
+    sentences = list(doc.sents)
+    if not sentences:
+        return [], np.zeros(0)
+
+    attrs = doc.to_array([LEMMA, IS_STOP, IS_PUNCT, IS_SPACE])
+    content = ~attrs[:, 1:].astype(bool).any(axis=1)
+
+    # Frequency of each token's lemma, zero for tokens that do not count
+    _, inverse, counts = np.unique(attrs[content, 0], return_inverse=True, return_counts=True)
+    weights = np.zeros(len(doc), dtype=np.int64)
+    weights[content] = counts[inverse]
+
+    # Sentence sums from one cumulative sum over the document
+    totals = np.concatenate(([0], np.cumsum(weights)))
+    starts = np.fromiter((sent.start for sent in sentences), dtype=np.int64, count=len(sentences))
+    ends = np.fromiter((sent.end for sent in sentences), dtype=np.int64, count=len(sentences))
+    return [sent.text for sent in sentences], totals[ends] - totals[starts]
+
+
+def score_documents(nlp, texts, batch_size=32, n_process=1):
+    """Yield (sentences, scores) for each of texts, parsed in batches with nlp.pipe."""
+    for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+        yield score_doc(doc)
+
+
+def top_sentences(sentences, scores, count):
+    """The count best-scoring sentences, in document order. Sentences scoring 0 are never picked."""
+    scores = np.asarray(scores)
+    candidates = np.flatnonzero(scores > 0)
+    # Stable sort keeps the earlier sentence first on equal scores
+    best = candidates[np.argsort(-scores[candidates], kind="stable")[:count]]
+    return [sentences[i] for i in np.sort(best)]
@@ -0,0 +1,215 @@
+"""
+Shared summarization models for txtsummarizer.py and meetingsummary.py.
+
+Loading a transformers pipeline takes seconds and hundreds of megabytes, so
+models are loaded once per process, on first use, and kept warm for later
+requests. When the loaded models go over the memory budget, the least
+recently used ones are dropped first.
+
+    from summarization_models import get_summarizer
+    summarizer = get_summarizer("facebook/bart-large-cnn")
+
+Long texts are split into chunks measured in model tokens and summarized in
+batches of similar length; map_reduce_summarize then summarizes the chunk
+summaries, as many levels deep as it takes to fit one chunk.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from statistics import median_low
+
+DEFAULT_MEMORY_BUDGET_MB = 4096
+
+# Used when a model's size cannot be measured from its parameters
+DEFAULT_MODEL_SIZE_MB = 1500
+
+# Texts share a batch, and so one summary length setting, if their requested
+# max_length differs by at most this factor
+LENGTH_TOLERANCE = 1.25
+
+_Entry = namedtuple("_Entry", ["model", "size_mb", "last_used"])
+
+
+def load_pipeline(task, model=None):
+    """Default loader: a transformers pipeline (model=None uses the task's default)."""
+    from transformers import pipeline
+    return pipeline(task, model=model)
+
+
+def model_size_mb(model):
+    """Memory taken by a pipeline's weights, or the default estimate."""
+    try:
+        parameters = model.model.parameters()
+        return sum(p.numel() * p.element_size() for p in parameters) / (1024 * 1024)
+    except AttributeError:
+        return DEFAULT_MODEL_SIZE_MB
+
+
+class ModelRegistry:
+    """
+    Loads each (task, model) once and keeps it until the memory budget needs room.
+
+    Safe to use from several threads: concurrent requests for a model that is
+    still loading wait for that load instead of starting their own. The model
+    just requested is never evicted, even if it alone is over the budget.
+    """
+
+    def __init__(self, loader=load_pipeline, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.loader = loader
+        self.memory_budget_mb = memory_budget_mb
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, task, model=None):
+        key = (task, model)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._touch(key, entry)
+                return entry.model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock, so other models stay available
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._touch(key, entry)
+                    return entry.model
+            loaded = self.loader(task, model)
+            with self._lock:
+                self._models[key] = _Entry(loaded, model_size_mb(loaded), time.monotonic())
+                self._evict(keep=key)
+        return loaded
+
+    def _touch(self, key, entry):
+        self._models[key] = entry._replace(last_used=time.monotonic())
+        self._models.move_to_end(key)
+
+    def _evict(self, keep):
+        while self.loaded_mb() > self.memory_budget_mb:
+            oldest = next((key for key in self._models if key != keep), None)
+            if oldest is None:
+                break
+            # Threads still running the model keep it alive until they finish
+            del self._models[oldest]
+
+    def loaded_mb(self):
+        return sum(entry.size_mb for entry in self._models.values())
+
+    def loaded(self):
+        """(task, model) keys of the loaded models, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+registry = ModelRegistry()
+
+
+def get_summarizer(model=None):
+    """The process-wide summarization pipeline for model (None for the default)."""
+    return registry.get("summarization", model)
+
+
+def chunk_token_limit(summarizer):
+    """Largest chunk the summarizer's model accepts, with room for special tokens."""
+    # Some tokenizers report a huge sentinel instead of a real limit
+    return min(summarizer.tokenizer.model_max_length, 1024) - 16
+
+
+def token_chunks(text, tokenizer, max_tokens):
+    """Split text into sentence-aligned chunks of at most max_tokens model tokens."""
+    from nltk.tokenize import sent_tokenize
+
+    sentences = sent_tokenize(text)
+    if not sentences:
+        return []
+    counts = [len(ids) for ids in tokenizer(sentences, add_special_tokens=False)["input_ids"]]
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence, count in zip(sentences, counts):
+        if count > max_tokens:
+            # A sentence longer than a whole chunk is split on token boundaries
+            if current:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            ids = tokenizer(sentence, add_special_tokens=False)["input_ids"]
+            chunks.extend(tokenizer.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens))
+            continue
+        if current and current_tokens + count > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += count
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def summarize_batched(summarizer, texts, lengths, batch_size=8, progress=None):
+    """
+    Summarize many texts with as few model calls as possible.
+
+    lengths[i] is the (max_length, min_length) wanted for texts[i]. Texts are
+    sorted by token count and run up to batch_size at a time, so each batch
+    pads to a similar length. A batch can only have one setting, so it takes
+    texts whose max_length is within LENGTH_TOLERANCE of each other and uses
+    the median of their settings. progress(done, total) is called after
+    every batch. Returns the summaries in the order of texts.
+    """
+    if not texts:
+        return []
+    token_counts = [len(ids) for ids in summarizer.tokenizer(list(texts))["input_ids"]]
+    order = sorted(range(len(texts)), key=lambda i: (token_counts[i], lengths[i]))
+
+    batches = []
+    for i in order:
+        if (batches and len(batches[-1]) < batch_size
+                and lengths[i][0] <= lengths[batches[-1][0]][0] * LENGTH_TOLERANCE):
+            batches[-1].append(i)
+        else:
+            batches.append([i])
+
+    summaries = [None] * len(texts)
+    done = 0
+    for batch in batches:
+        max_length = median_low(lengths[i][0] for i in batch)
+        min_length = min(median_low(lengths[i][1] for i in batch), max_length)
+        outputs = summarizer([texts[i] for i in batch], max_length=max_length,
+                             min_length=min_length, do_sample=False, truncation=True,
+                             batch_size=len(batch))
+        for i, output in zip(batch, outputs):
+            summaries[i] = output["summary_text"]
+        done += len(batch)
+        if progress:
+            progress(done, len(texts))
+    return summaries
+
+
+def map_reduce_summarize(summarizer, text, max_length=150, min_length=30, batch_size=8):
+    """
+    Summarize text of any length: summarize its chunks, then the summaries of
+    those, until everything fits in one chunk for a final summary.
+    """
+    limit = chunk_token_limit(summarizer)
+    chunks = token_chunks(text, summarizer.tokenizer, limit)
+
+    # Capping each summary at a quarter chunk makes every level at least a
+    # third the size of the one before, so this always ends
+    level_max = min(max_length, limit // 4)
+    level_lengths = (level_max, min(min_length, level_max))
+    while len(chunks) > 1:
+        summaries = summarize_batched(summarizer, chunks, [level_lengths] * len(chunks), batch_size)
+        chunks = token_chunks(" ".join(summaries), summarizer.tokenizer, limit)
+
+    if not chunks:
+        return ""
+    return summarize_batched(summarizer, chunks, [(max_length, min_length)])[0]
@@ -5,7 +5,6 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QSlider, QSpinBox, QComboBox, QProgressBar, QFrame)
 from PyQt5.QtCore import Qt, QPropertyAnimation, QEasingCurve, QTimer, QThread, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPalette
-import spacy
 import nltk
 from nltk.tokenize import sent_tokenize
 from nltk.corpus import stopwords
@@ -16,7 +15,8 @@ from sumy.summarizers.lex_rank import LexRankSummarizer
 from sumy.summarizers.luhn import LuhnSummarizer
 from sumy.nlp.stemmers import Stemmer
 from sumy.utils import get_stop_words
-from transformers import pipeline
+from summarization_models import chunk_token_limit, get_summarizer, summarize_batched, token_chunks
+from sentence_scoring import load_scoring_pipeline, score_documents, top_sentences
 
 # Download necessary NLTK data
 nltk.download('punkt', quiet=True)
@@ -24,12 +24,12 @@ nltk.download('stopwords', quiet=True)
 
 # Load spaCy model
 try:
-    nlp = spacy.load('en_core_web_sm')
+    nlp = load_scoring_pipeline('en_core_web_sm')
 except:
     # If model isn't available, download it
     import os
     os.system('python -m spacy download en_core_web_sm')
-    nlp = spacy.load('en_core_web_sm')
+    nlp = load_scoring_pipeline('en_core_web_sm')
 
 class SummarizationWorker(QThread):
     finished = pyqtSignal(str)
@@ -70,30 +70,8 @@ class SummarizationWorker(QThread):
         # Update progress
         self.progress.emit(40)
         
-        # Process the text with spaCy
-        doc = nlp(text)
-        sentences = [sent.text for sent in doc.sents]
-        
-        # Calculate word frequency
-        word_freq = {}
-        for word in doc:
-            if not word.is_stop and not word.is_punct and word.text.lower() not in word_freq:
-                word_freq[word.text.lower()] = 1
-            elif not word.is_stop and not word.is_punct:
-                word_freq[word.text.lower()] += 1
-        
-        # Update progress
-        self.progress.emit(60)
-        
-        # Calculate sentence scores
-        sentence_scores = {}
-        for i, sentence in enumerate(sentences):
-            for word in nlp(sentence):
-                if word.text.lower() in word_freq:
-                    if i not in sentence_scores:
-                        sentence_scores[i] = word_freq[word.text.lower()]
-                    else:
-                        sentence_scores[i] += word_freq[word.text.lower()]
+        # Process the text with spaCy once; sentences are scored from that parse
+        sentences, scores = next(score_documents(nlp, [text]))
         
         # Update progress
         self.progress.emit(80)
@@ -103,11 +81,8 @@ class SummarizationWorker(QThread):
         else:
             num_sentences = min(self.ratio_or_count, len(sentences))
             
-        # Get top N sentences
-        top_sentences = sorted(sentence_scores.items(), key=lambda x: x[1], reverse=True)[:num_sentences]
-        top_sentences = sorted(top_sentences, key=lambda x: x[0])  # Sort by original order
-        
-        summary = " ".join([sentences[i] for i, _ in top_sentences])
+        # Get top N sentences, in original order
+        summary = " ".join(top_sentences(sentences, scores, num_sentences))
         return summary
     
     def sumy_summarize(self, text, summarizer_class):
@@ -135,42 +110,21 @@ class SummarizationWorker(QThread):
         # Update progress
         self.progress.emit(40)
         
-        # Load summarization pipeline
-        summarizer = pipeline("summarization")
+        # Only the first request loads the model; later ones reuse it
+        summarizer = get_summarizer()
         
         # Update progress
         self.progress.emit(60)
         
-        # For longer texts, split into chunks
-        max_chunk_length = 1024
-        chunks = []
-        
-        current_length = 0
-        current_chunk = ""
-        
-        for sentence in sent_tokenize(text):
-            sentence_length = len(sentence)
-            
-            if current_length + sentence_length <= max_chunk_length:
-                current_chunk += sentence + " "
-                current_length += sentence_length
-            else:
-                chunks.append(current_chunk)
-                current_chunk = sentence + " "
-                current_length = sentence_length
-                
-        if current_chunk:
-            chunks.append(current_chunk)
+        # For longer texts, split into chunks of at most one model input
+        chunks = token_chunks(text, summarizer.tokenizer, chunk_token_limit(summarizer))
             
         # Update progress
         self.progress.emit(70)
         
-        # Process each chunk
-        summaries = []
-        for i, chunk in enumerate(chunks):
-            if not chunk.strip():
-                continue
-            
+        # Work out each chunk's summary length
+        lengths = []
+        for chunk in chunks:
             # Calculate max_length based on ratio or absolute length
             if self.is_ratio:
                 max_length = max(10, int(len(chunk.split()) * self.ratio_or_count))
@@ -181,13 +135,12 @@ class SummarizationWorker(QThread):
             
             # Ensure max_length is within limits
             max_length = min(max_length, 150)
-            
-            summary = summarizer(chunk, max_length=max_length, min_length=min_length, do_sample=False)
-            summaries.append(summary[0]['summary_text'])
-            
-            # Update progress proportionally
-            progress = 70 + (i + 1) * 20 // len(chunks)
-            self.progress.emit(progress)
+            lengths.append((max_length, min_length))
+        
+        # Chunks run through the model in batches; update progress proportionally
+        summaries = summarize_batched(
+            summarizer, chunks, lengths,
+            progress=lambda done, total: self.progress.emit(70 + done * 20 // total))
             
         return " ".join(summaries)
 